@@ -0,0 +1,18 @@
+import pytest
+from django.conf import settings
+
+from core.test_runner import isolated_cache_settings
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_caches(tmp_path_factory):
+    """Кеши, метрики и стеки профилировщика тестов - во временном каталоге,
+    а не в CACHE_DIR сервера разработки."""
+    cache_settings = isolated_cache_settings(
+        str(tmp_path_factory.mktemp('cache'))
+    )
+    cache_settings.enable()
+    yield
+    cache_settings.disable()
+    # Снимок метрик тестового процесса при выходе никуда не пишется.
+    settings.METRICS_DIR = None
@@ -0,0 +1,321 @@
+"""Кеш в файле SQLite, общий для всех процессов на одной машине.
+
+LocMemCache у каждого воркера свой, поэтому и попадания, и сброс кеша
+не доходят до соседних процессов. Здесь записи лежат в одном файле
+SQLite в режиме WAL: читатели не блокируют писателя, а запись идёт
+одной транзакцией BEGIN IMMEDIATE. При переполнении вытесняются давно
+не читанные записи (LRU). Значения сериализуются классом из опции
+SERIALIZER (по умолчанию pickle). Время обращений попадает в фазу
+cache запроса, попадания и промахи - в его счётчики (core.timing) и
+в метрики по префиксам ключей (core.metrics).
+
+    CACHES = {'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': '/var/tmp/yatube/cache.sqlite3',
+        'OPTIONS': {'SERIALIZER': 'core.cache.JSONSerializer'},
+    }}
+"""
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from core.metrics import CACHE_REQUESTS, key_prefix
+from core.timing import record, timed
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+# Время последнего чтения обновляется не чаще раза в столько секунд,
+# чтобы чтения почти никогда не превращались в запись.
+LRU_RESOLUTION = 10
+BUSY_TIMEOUT = 5000
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+FRESH = '(expires IS NULL OR expires > ?)'
+
+
+class PickleSerializer:
+    protocol = pickle.HIGHEST_PROTOCOL
+
+    def dumps(self, value):
+        return pickle.dumps(value, self.protocol)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+class JSONSerializer:
+    """Переносимый формат для простых значений, без HttpResponse."""
+
+    def dumps(self, value):
+        return json.dumps(value, separators=(',', ':')).encode()
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        # Имя кеша для метрик - имя файла без расширения.
+        self.name = os.path.splitext(os.path.basename(location))[0]
+        options = params.get('OPTIONS', {})
+        self.serializer = import_string(
+            options.get('SERIALIZER', 'core.cache.PickleSerializer')
+        )()
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        """Соединение текущего потока; после fork открывается заново."""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT / 1000, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT}')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _write(self):
+        """Транзакция, сразу берущая блокировку записи."""
+        return _Transaction(self._db)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def validate_key(self, key):
+        # Проверка BaseCache написана под memcached: ключи длиннее 250
+        # символов, с пробелами или не ASCII. Здесь ключ - TEXT в SQLite,
+        # и ключи со slug и username на кириллице допустимы.
+        pass
+
+    def _touch_accessed(self, db, keys, now):
+        db.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?',
+            [(now, key, now - LRU_RESOLUTION) for key in keys],
+        )
+
+    @timed('cache')
+    def get(self, key, default=None, version=None):
+        found = self._get_many({self._key(key, version): key})
+        return found.get(key, default)
+
+    @timed('cache')
+    def get_many(self, keys, version=None):
+        return self._get_many(
+            {self._key(key, version): key for key in keys}
+        )
+
+    def _get_many(self, keys):
+        """Значения по ключам кеша keys - словарю {ключ в базе: ключ}."""
+        if not keys:
+            return {}
+        now = time.time()
+        db = self._db
+        placeholders = ', '.join('?' * len(keys))
+        rows = db.execute(
+            f'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) AND {FRESH}',
+            (*keys, now),
+        ).fetchall()
+        stale = [
+            key for key, _, accessed in rows
+            if accessed < now - LRU_RESOLUTION
+        ]
+        self._record_reads(keys, rows)
+        if stale:
+            with self._write():
+                self._touch_accessed(db, stale, now)
+        return {
+            keys[key]: self.serializer.loads(value)
+            for key, value, _ in rows
+        }
+
+    def _record_reads(self, keys, rows):
+        """Попадания и промахи: в таймер запроса и в метрики по префиксам."""
+        found = {key for key, _, _ in rows}
+        record('cache_hits', len(found))
+        record('cache_misses', len(keys) - len(found))
+        for key, raw_key in keys.items():
+            CACHE_REQUESTS.inc(
+                cache=self.name,
+                prefix=key_prefix(raw_key),
+                result='hit' if key in found else 'miss',
+            )
+
+    @timed('cache')
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {FRESH}',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    @timed('cache')
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    @timed('cache')
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == 0:
+            self.delete_many(data, version)
+            return []
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version), self.serializer.dumps(value),
+             expires, now)
+            for key, value in data.items()
+        ]
+        db = self._db
+        with self._write():
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                rows,
+            )
+            self._cull(db, now)
+        return []
+
+    @timed('cache')
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if timeout == 0:
+            return False
+        now = time.time()
+        db = self._db
+        with self._write():
+            db.execute(
+                f'DELETE FROM cache WHERE key = ? AND NOT {FRESH}',
+                (key, now),
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                (key, self.serializer.dumps(value),
+                 self.get_backend_timeout(timeout), now),
+            ).rowcount == 1
+            if added:
+                self._cull(db, now)
+        return added
+
+    @timed('cache')
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write():
+            return self._db.execute(
+                f'UPDATE cache SET expires = ?, accessed = ? '
+                f'WHERE key = ? AND {FRESH}',
+                (self.get_backend_timeout(timeout), now, key, now),
+            ).rowcount == 1
+
+    @timed('cache')
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        db = self._db
+        with self._write():
+            row = db.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {FRESH}',
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self.serializer.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (self.serializer.dumps(value), now, key),
+            )
+        return value
+
+    @timed('cache')
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    @timed('cache')
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        with self._write():
+            self._db.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    @timed('cache')
+    def clear(self):
+        with self._write():
+            self._db.execute('DELETE FROM cache')
+
+    def _cull(self, db, now):
+        """Удаляет просроченные и давно не читанные записи при переполнении."""
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            ' SELECT key FROM cache ORDER BY accessed LIMIT ?'
+            ')',
+            (count // self._cull_frequency,),
+        )
+
+    def close(self, **kwargs):
+        # Соединения живут всё время работы процесса.
+        pass
+
+
+class _Transaction:
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class CacheProxy:
+    """Кеш из CACHES, который ищется при каждом обращении.
+
+    Как django.core.cache.cache, но для любого алиаса. Объект из
+    caches[alias], сохранённый при импорте модуля, не заметил бы смены
+    CACHES (например, в тестах) и продолжал бы работать со старым кешем.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __getattr__(self, name):
+        return getattr(caches[self.alias], name)
@@ -0,0 +1,119 @@
+"""Навигация по датам (date_hierarchy) по индексу поля даты.
+
+QuerySet.dates() выполняет SELECT DISTINCT django_date_trunc(...):
+функция считается для каждой строки, и на большой таблице это полный
+проход. DateHierarchyQuerySet находит периоды прыжками по индексу
+(loose index scan): первая дата не раньше начала периода, затем
+начало следующего периода и так далее - запрос на период и ещё один.
+
+Min и Max одного поля в aggregate() тоже считаются отдельными
+запросами с ORDER BY ... LIMIT 1: SQLite берёт каждый с края индекса,
+а оба в одном запросе - только полным проходом.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import DateTimeField, F, Max, Min, QuerySet
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+
+KINDS = ('year', 'month', 'day')
+
+
+def truncate(value, kind):
+    """Начало периода kind, в который попадает дата value."""
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    if kind == 'year':
+        return value.replace(month=1, day=1)
+    if kind == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def next_period(day, kind):
+    """Начало периода, следующего за тем, что начинается в day."""
+    if kind == 'year':
+        return day.replace(year=day.year + 1)
+    if kind == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(
+            day=1
+        )
+    return day + datetime.timedelta(days=1)
+
+
+class DateHierarchyQuerySet(QuerySet):
+    """QuerySet, у которого dates() и Min/Max дат идут по индексу."""
+
+    @classmethod
+    def wrap(cls, queryset):
+        """Тот же запрос в виде DateHierarchyQuerySet."""
+        return cls(
+            queryset.model, queryset.query.chain(), queryset._db,
+            queryset._hints,
+        )
+
+    def _plain(self):
+        query = self.query
+        return query.can_filter() and not (
+            query.distinct or query.combinator or query.group_by is not None
+        )
+
+    def dates(self, field_name, kind, order='ASC'):
+        """Даты начала непустых периодов списком, как у QuerySet.dates()."""
+        if (
+            kind not in KINDS or order not in ('ASC', 'DESC')
+            or LOOKUP_SEP in field_name or not self._plain()
+        ):
+            return super().dates(field_name, kind, order)
+        field = self.model._meta.get_field(field_name)
+        queryset = self.filter(
+            **{f'{field_name}__isnull': False}
+        ).order_by(field_name)
+        days = []
+        value = queryset.values_list(field_name, flat=True).first()
+        while value is not None:
+            days.append(truncate(value, kind))
+            try:
+                start = next_period(days[-1], kind)
+            except (OverflowError, ValueError):
+                break
+            if isinstance(field, DateTimeField):
+                start = datetime.datetime.combine(start, datetime.time())
+                if settings.USE_TZ:
+                    start = timezone.make_aware(start)
+            # SQLite ищет по индексу от первой нижней границы в WHERE,
+            # поэтому начало периода идёт раньше фильтров выборки.
+            start = QuerySet(self.model, using=self._db).filter(
+                **{f'{field_name}__gte': start}
+            )
+            value = (start & queryset).values_list(
+                field_name, flat=True
+            ).first()
+        if order == 'DESC':
+            days.reverse()
+        return days
+
+    def aggregate(self, *args, **kwargs):
+        """Min и Max полей - по запросу на каждый, с края индекса."""
+        orderings = {}
+        for alias, aggregate in kwargs.items():
+            if type(aggregate) not in (Min, Max) or aggregate.filter:
+                break
+            source, = aggregate.get_source_expressions()
+            if not isinstance(source, F):
+                break
+            prefix = '-' if isinstance(aggregate, Max) else ''
+            orderings[alias] = (source.name, prefix + source.name)
+        else:
+            if orderings and not args and self._plain():
+                return {
+                    alias: self.filter(**{f'{name}__isnull': False})
+                    .order_by(ordering)
+                    .values_list(name, flat=True)
+                    .first()
+                    for alias, (name, ordering) in orderings.items()
+                }
+        return super().aggregate(*args, **kwargs)
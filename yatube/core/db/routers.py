@@ -0,0 +1,93 @@
+"""Чтение с реплик, запись в основную базу.
+
+Запись всегда идёт в default, чтение - в случайную базу из
+DATABASE_REPLICAS. Чтобы пользователь сразу видел свои изменения,
+чтение закрепляется за основной базой:
+
+- внутри транзакции на default;
+- до конца запроса после первой записи и в запросах POST и т. п.;
+- на REPLICA_MAX_LAG секунд после записи - по cookie, которую ставит
+  ReplicaPinningMiddleware.
+
+Локально реплику можно сделать копией файла SQLite:
+
+    DATABASES['replica'] = {
+        'ENGINE': 'core.db.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+и обновлять её командой copy_replicas.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', 0) > 0
+
+
+def has_written():
+    """Была ли запись с начала текущего routing_scope."""
+    return getattr(_state, 'written', False)
+
+
+@contextmanager
+def pin_primary():
+    """Все чтения внутри блока идут в основную базу."""
+    _state.pinned = getattr(_state, 'pinned', 0) + 1
+    try:
+        yield
+    finally:
+        _state.pinned -= 1
+
+
+@contextmanager
+def routing_scope(pinned=False):
+    """Границы запроса: запись внутри закрепляет чтение до конца блока."""
+    saved = getattr(_state, 'pinned', 0), has_written()
+    _state.pinned = int(pinned)
+    _state.written = False
+    try:
+        yield
+    finally:
+        _state.pinned, _state.written = saved
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (
+            not replicas()
+            or is_pinned()
+            or has_written()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in replicas():
+            return False
+        return None
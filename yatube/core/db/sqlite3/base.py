@@ -0,0 +1,69 @@
+"""Бэкенд SQLite с настройками для работы под нагрузкой.
+
+Каждое новое соединение переводится в режим WAL (читатели не ждут
+писателя) и получает PRAGMA из PRAGMAS; их можно переопределить
+опцией pragmas. Транзакции atomic() открываются как BEGIN IMMEDIATE:
+блокировка записи берётся сразу и ждёт busy_timeout, а не падает с
+«database is locked» при попытке превратить чтение в запись.
+
+    DATABASES = {'default': {
+        'ENGINE': 'core.db.sqlite3',
+        'NAME': '/var/lib/yatube/db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'pragmas': {'mmap_size': 0}},
+    }}
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    # В режиме WAL NORMAL не портит базу при сбое, а fsync идёт
+    # только на контрольных точках.
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ, а не в страницах.
+    'cache_size': -64 * 1024,
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+DEFAULT_TRANSACTION_MODE = 'IMMEDIATE'
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    @property
+    def pragmas(self):
+        pragmas = {**PRAGMAS, **self.settings_dict['OPTIONS'].get(
+            'pragmas', {}
+        )}
+        if self.is_in_memory_db():
+            # У базы в памяти нет журнала на диске.
+            pragmas.pop('journal_mode', None)
+        return pragmas
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode', DEFAULT_TRANSACTION_MODE
+        ).upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
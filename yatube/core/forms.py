@@ -0,0 +1,34 @@
+import re
+
+from django import forms
+
+VIEW_NAME_RE = re.compile(r'^[\w-]+(:[\w-]+)*$')
+
+
+class ProfilerForm(forms.Form):
+    rate = forms.FloatField(
+        label='Доля запросов, %', min_value=0, max_value=100
+    )
+    views = forms.CharField(
+        label='Маршруты',
+        required=False,
+        help_text='Имена через запятую, например posts:index; пусто - все',
+    )
+    interval_ms = forms.IntegerField(
+        label='Интервал снятия стеков, мс', min_value=1, max_value=1000
+    )
+    reset = forms.BooleanField(label='Сбросить стеки', required=False)
+
+    def clean_views(self):
+        views = [
+            name for name in re.split(r'[\s,]+', self.cleaned_data['views'])
+            if name
+        ]
+        wrong = [name for name in views if not VIEW_NAME_RE.match(name)]
+        if wrong:
+            raise forms.ValidationError(
+                'Неверные имена маршрутов: %(names)s',
+                code='view_name',
+                params={'names': ', '.join(wrong)},
+            )
+        return views
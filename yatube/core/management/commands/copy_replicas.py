@@ -0,0 +1,23 @@
+from core.db.routers import replicas
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в базы DATABASE_REPLICAS'
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite':
+            raise CommandError('Копировать можно только базу SQLite')
+        if not replicas():
+            raise CommandError('DATABASE_REPLICAS пуст')
+        source.ensure_connection()
+        for alias in replicas():
+            target = connections[alias]
+            target.ensure_connection()
+            # Онлайн-бэкап SQLite: копия согласована, запись не ждёт.
+            source.connection.backup(target.connection)
+            self.stdout.write(f'{alias}: скопирована')
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
@@ -0,0 +1,157 @@
+"""Нагрузочный тест профилей SQLite.
+
+Потоки имитируют запросы к сайту: большинство читает ленту, часть
+добавляет запись и увеличивает счётчик в одной транзакции. Профиль
+baseline - стандартный бэкенд без постоянных соединений, production -
+core.db.sqlite3 с CONN_MAX_AGE. Для каждого профиля печатается число
+запросов в секунду и ошибок «database is locked».
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+PROFILES = {
+    'baseline': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': 0,
+    },
+    'production': {
+        'ENGINE': 'core.db.sqlite3',
+        'CONN_MAX_AGE': None,
+    },
+}
+SCHEMA = (
+    'CREATE TABLE load_item ('
+    ' id INTEGER PRIMARY KEY, author INTEGER NOT NULL,'
+    ' text TEXT NOT NULL, created REAL NOT NULL)',
+    'CREATE INDEX load_item_author ON load_item (author, created)',
+    'CREATE TABLE load_author ('
+    ' id INTEGER PRIMARY KEY, items INTEGER NOT NULL)',
+)
+AUTHORS = 50
+PAGE = 10
+
+
+def _read(cursor, author):
+    cursor.execute(
+        'SELECT id, text FROM load_item WHERE author = %s '
+        'ORDER BY created DESC LIMIT %s',
+        (author, PAGE),
+    )
+    cursor.fetchall()
+
+
+def _write(alias, author):
+    # Как ORM: сначала чтение, затем запись в той же транзакции.
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            _read(cursor, author)
+            cursor.execute(
+                'INSERT INTO load_item (author, text, created) '
+                'VALUES (%s, %s, %s)',
+                (author, 'x' * 200, time.time()),
+            )
+            cursor.execute(
+                'UPDATE load_author SET items = items + 1 WHERE id = %s',
+                (author,),
+            )
+
+
+def _worker(alias, deadline, write_ratio, stats, lock):
+    done = errors = 0
+    while time.monotonic() < deadline:
+        author = random.randint(1, AUTHORS)
+        try:
+            if random.random() < write_ratio:
+                _write(alias, author)
+            else:
+                with connections[alias].cursor() as cursor:
+                    _read(cursor, author)
+            done += 1
+        except OperationalError:
+            errors += 1
+        finally:
+            # То же, что делает Django по окончании запроса.
+            connections[alias].close_if_unusable_or_obsolete()
+    connections[alias].close()
+    with lock:
+        stats['requests'] += done
+        stats['errors'] += errors
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность профилей SQLite'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Доля запросов с записью',
+        )
+        parser.add_argument(
+            '--profile', choices=sorted(PROFILES), action='append',
+            help='Профиль для проверки; по умолчанию все',
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name in options['profile'] or PROFILES:
+                results[name] = self.run_profile(
+                    name, os.path.join(directory, f'{name}.sqlite3'),
+                    options,
+                )
+        return self.report(results)
+
+    def run_profile(self, name, path, options):
+        alias = f'load_{name}'
+        connections.databases[alias] = {'NAME': path, **PROFILES[name]}
+        try:
+            with connections[alias].cursor() as cursor:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+                for author in range(1, AUTHORS + 1):
+                    cursor.execute(
+                        'INSERT INTO load_author (id, items) VALUES (%s, 0)',
+                        (author,),
+                    )
+            connections[alias].close()
+            stats = {'requests': 0, 'errors': 0}
+            lock = threading.Lock()
+            deadline = time.monotonic() + options['seconds']
+            threads = [
+                threading.Thread(
+                    target=_worker,
+                    args=(alias, deadline, options['write_ratio'],
+                          stats, lock),
+                )
+                for _ in range(options['threads'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            del connections[alias]
+            del connections.databases[alias]
+        stats['per_second'] = stats['requests'] / options['seconds']
+        return stats
+
+    def report(self, results):
+        lines = [
+            f'{name}: {stats["per_second"]:.0f} запросов/с, '
+            f'ошибок блокировки: {stats["errors"]}'
+            for name, stats in results.items()
+        ]
+        if {'baseline', 'production'} <= set(results):
+            baseline = results['baseline']['per_second']
+            if baseline:
+                gain = results['production']['per_second'] / baseline
+                lines.append(f'Ускорение: {gain:.1f}x')
+        return '\n'.join(lines)
@@ -0,0 +1,189 @@
+"""Отдача файлов из MEDIA_ROOT.
+
+Сами байты по возможности передаёт фронтенд-сервер: nginx по заголовку
+X-Accel-Redirect или Apache/lighttpd по X-Sendfile (MEDIA_SENDFILE).
+Без него файл отдаёт FileResponse: сервер WSGI передаёт его через
+wsgi.file_wrapper (sendfile), а запросы Range обслуживаются здесь.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+# Имя файла из ContentAddressedStorage - sha256 содержимого.
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}$')
+# Ответы с самим файлом; ошибкам долгий Cache-Control не нужен.
+CACHEABLE_STATUSES = (200, 206, 304)
+
+
+class FileRange:
+    """Файл, из которого читается только length байт начиная со start."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Границы (start, end) из заголовка Range или None, если он не нужен.
+
+    Несколько диапазонов сразу не поддерживаются: на такой запрос, как
+    разрешает RFC 7233, отдаётся весь файл. Для недостижимого диапазона
+    бросает ValueError.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """Проверка If-Range: диапазон отдаётся, только если файл не менялся."""
+    condition = request.META.get('HTTP_IF_RANGE')
+    if not condition:
+        return True
+    if condition.startswith('"'):
+        return condition == etag
+    return parse_http_date_safe(condition) == last_modified
+
+
+def content_hash(path):
+    """sha256 содержимого из имени файла или None, если имя не хеш."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name if HASHED_NAME_RE.match(name) else None
+
+
+def file_etag(path, stat):
+    """ETag файла: хеш содержимого из имени или размер и время изменения.
+
+    Время изменения у файлов с хешем в имени не подходит: хранилище
+    обновляет его, когда загружают уже сохранённое содержимое.
+    """
+    digest = content_hash(path)
+    if digest:
+        return f'"{digest}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def patch_media_cache_control(response, path):
+    """Файл с хешем в имени не меняется и кешируется надолго.
+
+    Старые файлы с обычными именами могут перезаписать, поэтому их
+    кешируют ненадолго и затем перепроверяют по ETag.
+    """
+    if content_hash(path):
+        patch_cache_control(
+            response, public=True, immutable=True,
+            max_age=settings.MEDIA_CACHE_MAX_AGE,
+        )
+    else:
+        patch_cache_control(
+            response, public=True, must_revalidate=True,
+            max_age=settings.MEDIA_MUTABLE_MAX_AGE,
+        )
+
+
+def sendfile_response(path, name, content_type):
+    """Пустой ответ, файл для которого отдаст фронтенд-сервер."""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == X_ACCEL_REDIRECT:
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX + name
+        )
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def file_response(request, full_path, size, content_type, use_range):
+    """FileResponse со всем файлом или с запрошенным диапазоном."""
+    try:
+        byte_range = use_range and parse_range(
+            request.META.get('HTTP_RANGE', ''), size
+        )
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    file = open(full_path, 'rb')
+    if not byte_range:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            FileRange(file, start, end - start + 1),
+            content_type=content_type,
+            status=206,
+        )
+        response.block_size = CHUNK_SIZE
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        size = end - start + 1
+    response['Content-Length'] = size
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдаёт файл из MEDIA_ROOT с ETag, Last-Modified и Range."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден')
+    etag = file_etag(full_path, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        if settings.MEDIA_SENDFILE:
+            response = sendfile_response(full_path, path, content_type)
+        else:
+            response = file_response(
+                request, full_path, stat.st_size, content_type,
+                range_applies(request, etag, last_modified),
+            )
+        if encoding:
+            response['Content-Encoding'] = encoding
+    if response.status_code in CACHEABLE_STATUSES:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_media_cache_control(response, full_path)
+    return response
@@ -0,0 +1,338 @@
+"""Метрики процесса в текстовом формате Prometheus.
+
+Счётчики и гистограммы живут в памяти процесса. Чтобы эндпоинт
+/metrics/ видел все воркеры, каждый процесс не реже раза в
+METRICS_FLUSH_INTERVAL секунд (после запроса и при выходе) сохраняет
+снимок своих значений в файл METRICS_DIR, а эндпоинт складывает
+снимки всех процессов. Файлы завершившихся процессов остаются, чтобы
+счётчики не уменьшались; каталог очищают при деплое, вместе со
+сбросом счётчиков. Без METRICS_DIR видны только метрики текущего
+процесса.
+
+    UPLOADS = registry.histogram(
+        'yatube_upload_size_bytes', 'Размер загрузок',
+        buckets=(1024, 1024 * 1024),
+    )
+    UPLOADS.observe(size)
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 1
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+# Сколько сегментов ключа кеша через «:» составляют его префикс.
+KEY_PREFIX_SEGMENTS = 2
+KEY_NAME_RE = re.compile(r'[A-Za-z_-]+')
+# Части через «.», с которых начинаются идентификаторы: числа и хеши,
+# например md5 аргументов в 'template.cache.index_page.<md5>'.
+KEY_ID_RE = re.compile(r'[0-9]|[0-9a-f]{8,}$')
+
+
+def _segment_prefix(segment):
+    """Начало сегмента ключа до первого идентификатора.
+
+    Возвращает префикс и признак того, что сегмент вошёл целиком.
+    """
+    names = []
+    for name in segment.split('.'):
+        match = KEY_NAME_RE.match(name)
+        if KEY_ID_RE.match(name) or match is None:
+            return '.'.join(names), False
+        names.append(match.group())
+        if match.end() != len(name):
+            return '.'.join(names), False
+    return '.'.join(names), True
+
+
+def key_prefix(key):
+    """Начало ключа кеша без идентификаторов: 'feed:index_page'."""
+    segments = []
+    parts = str(key).split(':', KEY_PREFIX_SEGMENTS)
+    for segment in parts[:KEY_PREFIX_SEGMENTS]:
+        prefix, complete = _segment_prefix(segment)
+        if prefix:
+            segments.append(prefix)
+        if not complete:
+            break
+    return ':'.join(segments) or 'other'
+
+
+def write_snapshot(directory, filename, data):
+    """Атомарно записывает data в JSON: читатели не видят половину файла."""
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(data, file)
+        os.replace(temporary, os.path.join(directory, filename))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in labels
+    ) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f'{self.name}: ожидались метки {self.labelnames}, '
+                f'получены {tuple(labels)}'
+            )
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def render(self, values):
+        """Строки метрики по сложенным значениям всех процессов."""
+        lines = [
+            f'# HELP {self.name} {_escape(self.documentation)}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        for (sample, labels), value in sorted(
+            values.items(), key=self._sort_key
+        ):
+            lines.append(
+                f'{sample}{_format_labels(labels)} {_format_value(value)}'
+            )
+        return lines
+
+    def _sort_key(self, item):
+        (sample, labels), _ = item
+        return labels, sample
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self._labels(labels), amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        changes = [
+            (f'{self.name}_bucket', self._bucket_labels(labels, bound), 1)
+            for bound in self.buckets if value <= bound
+        ]
+        changes.append((f'{self.name}_sum', labels, value))
+        changes.append((f'{self.name}_count', labels, 1))
+        self.registry.add_many(changes)
+
+    def _bucket_labels(self, labels, bound):
+        return (*labels, ('le', _format_value(bound)))
+
+    def render(self, values):
+        # Бакеты без наблюдений тоже выводятся: Prometheus ждёт все.
+        values = dict(values)
+        for sample, labels in list(values):
+            if sample != f'{self.name}_count':
+                continue
+            for bound in self.buckets:
+                bucket = self._bucket_labels(labels, bound)
+                values.setdefault((f'{self.name}_bucket', bucket), 0)
+        return super().render(values)
+
+    def _sort_key(self, item):
+        (sample, labels), _ = item
+        base = tuple(label for label in labels if label[0] != 'le')
+        le = dict(labels).get('le')
+        bound = math.inf if le in (None, '+Inf') else float(le)
+        order = ('_bucket', '_sum', '_count').index(
+            sample[len(self.name):]
+        )
+        return base, order, bound
+
+
+class Registry:
+    """Метрики и их значения в текущем процессе."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._values = defaultdict(float)
+        self._pid = os.getpid()
+        # Время старта в имени: pid может достаться новому процессу.
+        self._filename = f'{self._pid}-{time.time_ns()}.json'
+        self._flushed = 0
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Метрика {metric.name} уже есть')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(
+            Counter(self, name, documentation, labelnames)
+        )
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=LATENCY_BUCKETS):
+        return self._register(
+            Histogram(self, name, documentation, labelnames, buckets)
+        )
+
+    def add(self, sample, labels, amount):
+        self.add_many([(sample, labels, amount)])
+
+    def add_many(self, changes):
+        with self._lock:
+            if self._pid != os.getpid():
+                # После fork значения родителя уже учтены в его снимке.
+                self._reset()
+            for sample, labels, amount in changes:
+                self._values[sample, labels] += amount
+
+    def snapshot(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            return dict(self._values)
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def flush(self, force=False):
+        """Сохраняет снимок процесса, если прошло METRICS_FLUSH_INTERVAL."""
+        directory = self.directory
+        if not directory:
+            return
+        interval = getattr(
+            settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL
+        )
+        now = time.monotonic()
+        if not force and now - self._flushed < interval:
+            return
+        self._flushed = now
+        data = [
+            [sample, labels, value]
+            for (sample, labels), value in self.snapshot().items()
+        ]
+        try:
+            write_snapshot(directory, self._filename, data)
+        except OSError:
+            logger.exception('Не удалось сохранить снимок метрик')
+
+    def _snapshots(self):
+        directory = self.directory
+        if not directory or not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == self._filename:
+                continue
+            try:
+                with open(os.path.join(directory, name)) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for sample, labels, value in data:
+                yield sample, tuple(map(tuple, labels)), value
+
+    def collect(self):
+        """Значения всех процессов, сложенные по метрике и меткам."""
+        values = defaultdict(float, self.snapshot())
+        for sample, labels, value in self._snapshots():
+            values[sample, labels] += value
+        return values
+
+    def _metric_of(self, sample):
+        if sample in self.metrics:
+            return self.metrics[sample]
+        base, _, _ = sample.rpartition('_')
+        return self.metrics.get(base)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        grouped = defaultdict(dict)
+        for (sample, labels), value in self.collect().items():
+            metric = self._metric_of(sample)
+            if metric is not None:
+                grouped[metric.name][sample, labels] = value
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.render(grouped[name]))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True))
+
+REQUEST_LATENCY = registry.histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по имени маршрута',
+    ('view', 'method'),
+)
+REQUESTS = registry.counter(
+    'yatube_requests_total',
+    'Ответы по имени маршрута и статусу',
+    ('view', 'method', 'status'),
+)
+DB_QUERIES = registry.counter(
+    'yatube_db_queries_total',
+    'SQL-запросы по имени маршрута',
+    ('view',),
+)
+DB_QUERY_SECONDS = registry.counter(
+    'yatube_db_query_seconds_total',
+    'Время SQL-запросов по имени маршрута',
+    ('view',),
+)
+CACHE_REQUESTS = registry.counter(
+    'yatube_cache_requests_total',
+    'Чтения кеша по префиксу ключа: попадания и промахи',
+    ('cache', 'prefix', 'result'),
+)
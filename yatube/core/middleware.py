@@ -0,0 +1,225 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from core.db.routers import has_written, replicas, routing_scope
+from core.metrics import (DB_QUERIES, DB_QUERY_SECONDS, REQUEST_LATENCY,
+                          REQUESTS, registry)
+from core.profiler import get_config, sampler, should_profile, store
+from core.queries import QueryStats, check_budget
+from core.slow_queries import SlowQueryLog
+from core.timing import request_timer
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.queries')
+timing_logger = logging.getLogger('core.timing')
+
+PIN_COOKIE = 'primary_db'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Методы, которые попадают в метки метрик; остальные - 'other'.
+METRIC_METHODS = (*SAFE_METHODS, 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class ReplicaPinningMiddleware:
+    """Закрепляет чтение за основной базой после записи пользователя.
+
+    Запросы с небезопасным методом целиком читают из основной базы.
+    Если запрос что-то записал, ответ ставит cookie на REPLICA_MAX_LAG
+    секунд: пока она жива, следующие запросы тоже не ходят в реплики
+    и видят свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in SAFE_METHODS
+            or PIN_COOKIE in request.COOKIES
+        )
+        with routing_scope(pinned):
+            response = self.get_response(request)
+            written = has_written()
+        if written and replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_MAX_LAG,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и проверяет бюджет view.
+
+    Статистика остаётся в request.query_stats, бюджет задаётся
+    декоратором core.queries.query_budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        with QueryStats().track() as stats:
+            request.query_stats = stats
+            response = self.get_response(request)
+        view_name = getattr(request.resolver_match, 'view_name', None)
+        logger.debug(
+            'view=%s queries=%d sql_ms=%.1f duplicates=%d',
+            view_name, stats.count, stats.time_ms, stats.duplicates,
+        )
+        if request.query_budget is not None:
+            check_budget(view_name, request.query_budget, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+
+class ServerTimingMiddleware:
+    """Время фаз запроса в заголовке Server-Timing и в логе.
+
+    Фазы template, thumbnail и cache отмечает код (core.timing), время
+    и число SQL-запросов берутся из request.query_stats
+    QueryBudgetMiddleware, поэтому эта middleware стоит раньше неё.
+    Заголовок выключается настройкой SERVER_TIMING, строка лога
+    core.timing пишется всегда с уровнем INFO; поля строки лежат и в
+    атрибуте timing записи лога.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_timer() as timer:
+            response = self.get_response(request)
+        stats = getattr(request, 'query_stats', None)
+        queries = stats.count if stats else 0
+        hits = timer.events['cache_hits']
+        misses = timer.events['cache_misses']
+        metrics = (
+            ('sql', stats.time_ms if stats else 0.0, f'{queries} queries'),
+            ('template', timer.time_ms('template'), None),
+            ('thumbnail', timer.time_ms('thumbnail'), None),
+            ('cache', timer.time_ms('cache'), f'{hits} hits {misses} misses'),
+            ('total', timer.elapsed_ms(), None),
+        )
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={duration:.1f}'
+                + (f';desc="{desc}"' if desc else '')
+                for name, duration, desc in metrics
+            )
+        if timing_logger.isEnabledFor(logging.INFO):
+            fields = {
+                'view': getattr(request.resolver_match, 'view_name', None),
+                'method': request.method,
+                'status': response.status_code,
+                **{
+                    f'{name}_ms': round(duration, 1)
+                    for name, duration, _ in metrics
+                },
+                'queries': queries,
+                'cache_hits': hits,
+                'cache_misses': misses,
+            }
+            line = ' '.join(
+                f'{key}={value}' for key, value in fields.items()
+            )
+            timing_logger.info('%s', line, extra={'timing': fields})
+        return response
+
+
+class MetricsMiddleware:
+    """Метрики запросов по имени маршрута: время, статусы, SQL.
+
+    SQL-запросы берутся из request.query_stats QueryBudgetMiddleware,
+    поэтому эта middleware стоит раньше неё. После запроса снимок
+    метрик процесса сохраняется для эндпоинта (core.metrics).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        # Адреса без маршрута не размножают метки.
+        view = getattr(request.resolver_match, 'view_name', None) or '-'
+        method = (
+            request.method if request.method in METRIC_METHODS else 'other'
+        )
+        REQUEST_LATENCY.observe(elapsed, view=view, method=method)
+        REQUESTS.inc(view=view, method=method, status=response.status_code)
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            DB_QUERIES.inc(stats.count, view=view)
+            DB_QUERY_SECONDS.inc(stats.seconds, view=view)
+        registry.flush()
+        return response
+
+
+class SamplingProfilerMiddleware:
+    """Снимает стеки доли запросов статистическим профилировщиком.
+
+    Какие запросы профилировать, решает настройка core.profiler: она
+    меняется на странице админки и проверяется после выбора view.
+    Стеки начинаются ниже этой middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profiled_generation = None
+        request.profiler_root = sys._getframe()
+        try:
+            return self.get_response(request)
+        finally:
+            generation = request.profiled_generation
+            if generation is not None:
+                stacks = sampler.stop(threading.get_ident())
+                store.add(
+                    request.resolver_match.view_name, stacks, generation
+                )
+            # Снимок пишется не чаще PROFILER_FLUSH_INTERVAL.
+            store.flush()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        config = get_config()
+        if not should_profile(request.resolver_match.view_name, config):
+            return
+        sampler.start(
+            threading.get_ident(), request.profiler_root,
+            config['interval_ms'],
+        )
+        request.profiled_generation = config['generation']
+
+
+class SlowQueryMiddleware:
+    """Пишет SQL-запросы дольше SLOW_QUERY_MS в журнал core.slow_queries.
+
+    SLOW_QUERY_MS = None выключает журнал.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = getattr(settings, 'SLOW_QUERY_MS', None)
+        if threshold is None:
+            return self.get_response(request)
+        slow_log = SlowQueryLog(request, threshold)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(slow_log)
+                )
+            return self.get_response(request)
@@ -0,0 +1,230 @@
+import base64
+import binascii
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, obj):
+    """Упаковывает (pub_date, pk) объекта в непрозрачную строку."""
+    raw = f'{direction}|{obj.pub_date.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, pub_date, pk) из строки курсора."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        raise InvalidCursor(cursor)
+    return direction, pub_date, pk
+
+
+def seek(queryset, direction, position, pk='pk'):
+    """Выборка в порядке (pub_date, pk) после позиции курсора.
+
+    FORWARD - к более старым объектам, BACKWARD - к более новым;
+    position - пара (pub_date, pk) или None для начала ленты. pk -
+    поле, которое различает объекты с одинаковой датой.
+    """
+    if direction == FORWARD:
+        queryset = queryset.order_by('-pub_date', f'-{pk}')
+        lookup = 'lt'
+    else:
+        queryset = queryset.order_by('pub_date', pk)
+        lookup = 'gt'
+    if position is None:
+        return queryset
+    pub_date, key = position
+    # Нестрогое условие по дате даёт SQLite границу для поиска по
+    # индексу, а OR уточняет позицию среди объектов с той же датой.
+    return queryset.filter(
+        Q(**{f'pub_date__{lookup}e': pub_date}),
+        Q(**{f'pub_date__{lookup}': pub_date})
+        | Q(**{f'{pk}__{lookup}': key}),
+    )
+
+
+class CursorPage(Page):
+    """Страница ленты, выбранная по курсору.
+
+    Номера и позиции в ленте у неё нет: методы Page, основанные на
+    номерах, возвращают None, а соседние страницы задают курсоры.
+    """
+
+    cursor_based = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        return None
+
+    def previous_page_number(self):
+        return None
+
+    def start_index(self):
+        return None
+
+    def end_index(self):
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, pk) для моделей на основе CreatedModel.
+
+    Каждая страница выбирается одним запросом с LIMIT per_page + 1:
+    без COUNT(*) и без OFFSET, поэтому стоимость не зависит от глубины.
+    Число объектов и страниц неизвестно: count и num_pages - None.
+    """
+
+    count = None
+    num_pages = None
+    page_range = range(0)
+
+    def get_page(self, cursor):
+        """Возвращает страницу по курсору; при ошибке - первую страницу."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+    def page(self, cursor):
+        direction, position = FORWARD, None
+        if cursor:
+            direction, *position = decode_cursor(cursor)
+        rows = list(self.page_queryset(direction, position))
+        if direction == FORWARD:
+            return self._forward_page(rows, has_previous=bool(cursor))
+        return self._backward_page(rows)
+
+    def page_queryset(self, direction=FORWARD, position=None):
+        """Запрос страницы после позиции курсора: per_page + 1 строк.
+
+        Лишняя строка показывает, есть ли страница дальше.
+        """
+        return seek(self.object_list, direction, position)[:self.per_page + 1]
+
+    def _forward_page(self, rows, has_previous):
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(
+                encode_cursor(FORWARD, rows[-1]) if has_next else None
+            ),
+            previous_cursor=(
+                encode_cursor(BACKWARD, rows[0])
+                if has_previous and rows else None
+            ),
+        )
+
+    def _backward_page(self, rows):
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=encode_cursor(FORWARD, rows[-1]) if rows else None,
+            previous_cursor=(
+                encode_cursor(BACKWARD, rows[0]) if has_previous else None
+            ),
+        )
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает большие выборки при каждом запросе.
+
+    Сначала считается не больше threshold + 1 строк (COUNT по подзапросу
+    с LIMIT): небольшие выборки получают точное число. Для больших число
+    берётся из статистики ANALYZE (sqlite_stat1), если выборка без
+    фильтров, иначе - из кеша, куда полный COUNT(*) попадает раз в
+    cache_timeout секунд. Такое число приблизительно: estimated = True.
+    """
+
+    threshold = 10_000
+    cache_timeout = 5 * 60
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        capped = queryset[:self.threshold + 1].count()
+        if capped <= self.threshold:
+            return capped
+        self.estimated = True
+        estimate = self.table_estimate()
+        if estimate is not None:
+            return max(estimate, capped)
+        key = self.cache_key()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.cache_timeout)
+        return count
+
+    def cache_key(self):
+        queryset = self.object_list
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(
+            f'{queryset.db}:{sql}:{params!r}'.encode()
+        ).hexdigest()
+        return f'count:{queryset.model._meta.label_lower}:{digest}'
+
+    def table_estimate(self):
+        """Число строк таблицы по sqlite_stat1 или None.
+
+        Оценка годится только для выборки без условий; статистику
+        собирает ANALYZE.
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if queryset.query.where or connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            # Таблицы sqlite_stat1 нет, пока не выполнен ANALYZE.
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s',
+                [queryset.model._meta.db_table],
+            )
+            rows = cursor.fetchall()
+        # Первое число stat - строк в таблице или индексе.
+        counts = [int(stat.split()[0]) for stat, in rows if stat]
+        return max(counts) if counts else None
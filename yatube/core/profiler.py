@@ -0,0 +1,247 @@
+"""Статистический профилировщик запросов для продакшена.
+
+Пока профилируемый запрос выполняется, фоновый поток раз в interval_ms
+снимает стек его потока (sys._current_frames) и считает одинаковые
+стеки. Остальные запросы не замедляются: поток спит, пока профилировать
+нечего. Стеки пишутся в формате collapsed, который понимают
+flamegraph.pl, speedscope и inferno:
+
+    posts:index;posts.views:index;django.core.paginator:page 17
+
+Настройка - доля запросов в процентах и имена маршрутов - хранится в
+общем кеше и меняется на лету со страницы админки; процессы
+перечитывают её не реже раза в CONFIG_TTL секунд. Каждый процесс
+копит стеки в памяти и не чаще раза в PROFILER_FLUSH_INTERVAL секунд
+(после профилируемого запроса и при выходе) сохраняет их в файл
+PROFILER_DIR, страница складывает файлы всех процессов. Сброс стеков
+начинает новое поколение: старые файлы удаляются, а процессы забывают
+накопленное.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from core.metrics import write_snapshot
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CONFIG_KEY = 'profiler:config'
+CONFIG_TTL = 5
+DEFAULT_FLUSH_INTERVAL = 5
+DEFAULT_CONFIG = {
+    'rate': 0.0,
+    'views': [],
+    'interval_ms': 10,
+    'generation': 0,
+}
+_config = {'config': None, 'expires': 0}
+
+
+def get_config(refresh=False):
+    """Настройка из общего кеша; в процессе она живёт CONFIG_TTL секунд."""
+    now = time.monotonic()
+    cached = _config
+    if refresh or cached['config'] is None or now > cached['expires']:
+        cached['config'] = {
+            **DEFAULT_CONFIG,
+            **(cache.get(CONFIG_KEY) or {}),
+        }
+        cached['expires'] = now + CONFIG_TTL
+    return cached['config']
+
+
+def set_config(rate, views, interval_ms, reset=False):
+    """Меняет настройку для всех процессов; reset сбрасывает стеки."""
+    config = get_config(refresh=True)
+    config = {
+        'rate': rate,
+        'views': sorted(views),
+        'interval_ms': interval_ms,
+        'generation': config['generation'] + (1 if reset else 0),
+    }
+    cache.set(CONFIG_KEY, config, None)
+    if reset:
+        store.clear(config['generation'])
+    return get_config(refresh=True)
+
+
+def should_profile(view_name, config):
+    if config['views'] and view_name not in config['views']:
+        return False
+    return random.random() * 100 < config['rate']
+
+
+def collapse(frame, root):
+    """Стек от кадра root (не включая его) до frame через «;»."""
+    names = []
+    while frame is not None and frame is not root:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Поток, который снимает стеки зарегистрированных потоков."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._targets = {}
+        self._thread = None
+
+    def start(self, ident, root, interval):
+        """Начинает снимать стеки потока ident ниже кадра root."""
+        with self._condition:
+            self._targets[ident] = (root, interval / 1000, Counter())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='profiler', daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self, ident):
+        """Перестаёт снимать стеки потока и возвращает их счётчик."""
+        with self._condition:
+            _, _, stacks = self._targets.pop(ident)
+        return stacks
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._targets:
+                    self._condition.wait()
+                # Под блокировкой: stop не отдаст счётчик, пока он растёт.
+                frames = sys._current_frames()
+                for ident, (root, _, stacks) in self._targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse(frame, root)] += 1
+                interval = min(
+                    target[1] for target in self._targets.values()
+                )
+                # Кадры держат локальные переменные запросов.
+                frames = frame = None
+            time.sleep(interval)
+
+
+class SampleStore:
+    """Стеки процесса и их снимки в PROFILER_DIR."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flushed = 0
+        self._reset(0)
+
+    def _reset(self, generation):
+        self.stacks = Counter()
+        self._changed = False
+        self.generation = generation
+        self._pid = os.getpid()
+        self._filename = f'{self._pid}-{time.time_ns()}.json'
+
+    @property
+    def directory(self):
+        return getattr(settings, 'PROFILER_DIR', None)
+
+    def add(self, view_name, stacks, generation):
+        """Добавляет стеки запроса; корень стека - имя маршрута."""
+        with self._lock:
+            if self._pid != os.getpid() or self.generation != generation:
+                self._reset(generation)
+            for stack, count in stacks.items():
+                key = f'{view_name};{stack}' if stack else view_name
+                self.stacks[key] += count
+            self._changed = True
+
+    def flush(self, force=False):
+        """Сохраняет стеки процесса, если прошло PROFILER_FLUSH_INTERVAL."""
+        directory = self.directory
+        if not directory:
+            return
+        interval = getattr(
+            settings, 'PROFILER_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL
+        )
+        now = time.monotonic()
+        with self._lock:
+            if not self._changed or self._pid != os.getpid():
+                return
+            if not force and now - self._flushed < interval:
+                return
+            self._flushed = now
+            self._changed = False
+            filename = self._filename
+            data = {
+                'generation': self.generation, 'stacks': dict(self.stacks),
+            }
+        try:
+            write_snapshot(directory, filename, data)
+        except OSError:
+            logger.exception('Не удалось сохранить стеки профилировщика')
+
+    def _files(self):
+        directory = self.directory
+        if not directory or not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.endswith('.json')
+        ]
+
+    def collect(self, generation):
+        """Стеки всех процессов текущего поколения."""
+        total = Counter()
+        with self._lock:
+            if self.generation == generation and self._pid == os.getpid():
+                total.update(self.stacks)
+        for path in self._files():
+            if os.path.basename(path) == self._filename:
+                continue
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if data.get('generation') == generation:
+                total.update(data['stacks'])
+        return total
+
+    def clear(self, generation):
+        """Удаляет стеки прошлых поколений."""
+        with self._lock:
+            self._reset(generation)
+        for path in self._files():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def leaves(stacks):
+    """Собственное время функций: сколько раз они были вершиной стека."""
+    total = Counter()
+    for stack, count in stacks.items():
+        total[stack.rpartition(';')[2]] += count
+    return total
+
+
+def render(stacks):
+    """Стеки в формате collapsed, самые частые первыми."""
+    return ''.join(
+        f'{stack} {count}\n' for stack, count in stacks.most_common()
+    )
+
+
+sampler = Sampler()
+store = SampleStore()
+atexit.register(lambda: store.flush(force=True))
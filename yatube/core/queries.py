@@ -0,0 +1,129 @@
+"""Учёт SQL-запросов запроса и бюджеты на них для view.
+
+QueryBudgetMiddleware считает запросы ко всем базам: их число, общее
+время и повторы одинаковых запросов с одинаковыми параметрами. Бюджет
+view задаётся декоратором:
+
+    @query_budget(queries=4, time_ms=50)
+    def index(request):
+        ...
+
+Превышение пишется в лог предупреждением. При QUERY_BUDGET_STRICT
+(его включает тестовый раннер core.test_runner) превышение числа
+запросов или повторов - ошибка QueryBudgetExceeded; время SQL зависит
+от машины, поэтому его превышение только пишется в лог.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Budget:
+    """Пределы для одного запроса к view; None - без предела."""
+
+    def __init__(self, queries=None, time_ms=None, duplicates=0):
+        self.queries = queries
+        self.time_ms = time_ms
+        self.duplicates = duplicates
+
+    def overruns(self, stats):
+        """Превышения: (строгое ли, описание)."""
+        problems = []
+        if self.queries is not None and stats.count > self.queries:
+            problems.append(
+                (True, f'запросов {stats.count} > {self.queries}')
+            )
+        if self.duplicates is not None and stats.duplicates > self.duplicates:
+            problems.append(
+                (True, f'повторов {stats.duplicates} > {self.duplicates}')
+            )
+        if self.time_ms is not None and stats.time_ms > self.time_ms:
+            problems.append(
+                (False, f'SQL {stats.time_ms:.1f} мс > {self.time_ms} мс')
+            )
+        return problems
+
+
+def query_budget(queries=None, time_ms=None, duplicates=0):
+    """Объявляет бюджет запросов view.
+
+    Бюджет хранится в атрибуте функции, его видят и декораторы,
+    обернувшие view через functools.wraps.
+    """
+    def decorator(view):
+        view.query_budget = Budget(queries, time_ms, duplicates)
+        return view
+    return decorator
+
+
+@contextmanager
+def untracked():
+    """Не считать запросы блока: это фоновая работа в потоке view."""
+    saved = getattr(_local, 'untracked', False)
+    _local.untracked = True
+    try:
+        yield
+    finally:
+        _local.untracked = saved
+
+
+class QueryStats:
+    """Обёртка execute_wrapper: число, время и повторы SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'untracked', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+            alias = context['connection'].alias
+            self.statements[alias, sql, repr(params)] += 1
+
+    @property
+    def time_ms(self):
+        return self.seconds * 1000
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный."""
+        return sum(count - 1 for count in self.statements.values())
+
+    @contextmanager
+    def track(self):
+        """Считает запросы ко всем базам внутри блока."""
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+
+def check_budget(view_name, budget, stats):
+    problems = budget.overruns(stats)
+    if not problems:
+        return
+    message = f'{view_name}: ' + ', '.join(text for _, text in problems)
+    strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+    if strict and any(hard for hard, _ in problems):
+        raise QueryBudgetExceeded(message)
+    logger.warning('Превышен бюджет запросов %s', message)
@@ -0,0 +1,125 @@
+"""Журнал медленных SQL-запросов с планом выполнения.
+
+SlowQueryMiddleware следит за запросами к базам во время обработки
+запроса. Запрос дольше SLOW_QUERY_MS миллисекунд пишется в лог
+core.slow_queries одной строкой JSON: текст и параметры, время, база,
+view, стек вызова в коде проекта и план EXPLAIN QUERY PLAN, снятый на
+том же соединении. По плану видно, где не хватает индекса:
+
+    {"view": "admin:posts_post_changelist", "ms": 412.7,
+     "plan": ["SCAN posts_post", "USE TEMP B-TREE FOR ORDER BY"], ...}
+
+Лог пишется в файл с ротацией, см. LOGGING в настройках.
+"""
+import json
+import logging
+import os
+import time
+import traceback
+
+from core import queries
+from core.metrics import registry
+
+from django.conf import settings
+from django.db import DatabaseError, NotSupportedError
+
+logger = logging.getLogger(__name__)
+
+# Сколько кадров кода проекта попадает в стек.
+STACK_DEPTH = 10
+# Запросы, для которых снимается план. EXPLAIN их не выполняет;
+# у SAVEPOINT, DDL и прочих плана нет.
+EXPLAINED = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+# Middleware и обёртки execute_wrapper - не место вызова запроса.
+SKIPPED_FILES = {
+    os.path.join('core', name)
+    for name in ('middleware.py', 'queries.py', 'slow_queries.py')
+}
+
+SLOW_QUERIES = registry.counter(
+    'yatube_db_slow_queries_total',
+    'SQL-запросы дольше SLOW_QUERY_MS по имени маршрута',
+    ('view',),
+)
+
+
+def project_stack(limit=STACK_DEPTH):
+    """Кадры кода проекта, от внешнего к вызову запроса."""
+    base = os.path.join(settings.BASE_DIR, '')
+    frames = [
+        (os.path.relpath(frame.filename, base), frame)
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(base)
+    ]
+    return [
+        f'{path}:{frame.lineno} in {frame.name}'
+        for path, frame in frames
+        if path not in SKIPPED_FILES
+    ][-limit:]
+
+
+def explain(connection, sql, params):
+    """Строки плана запроса или описание ошибки."""
+    try:
+        prefix = connection.ops.explain_query_prefix()
+    except NotSupportedError:
+        return []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as error:
+        return [f'Ошибка EXPLAIN: {error}']
+    # У SQLite последняя колонка - текст шага, у других баз - вся строка.
+    return [str(row[-1]) for row in rows]
+
+
+class SlowQueryLog:
+    """Обёртка execute_wrapper, которая пишет медленные запросы в лог."""
+
+    def __init__(self, request, threshold_ms):
+        self.request = request
+        self.threshold = threshold_ms / 1000
+        self._explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.threshold:
+            self.log(context['connection'], sql, params, many, elapsed)
+        return result
+
+    @property
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def log(self, connection, sql, params, many, elapsed):
+        view_name = self.view_name
+        SLOW_QUERIES.inc(view=view_name or '-')
+        plan = []
+        if not many and sql.lstrip().upper().startswith(EXPLAINED):
+            # EXPLAIN не входит ни в бюджет view, ни в этот журнал.
+            self._explaining = True
+            try:
+                with queries.untracked():
+                    plan = explain(connection, sql, params)
+            finally:
+                self._explaining = False
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'ms': round(elapsed * 1000, 1),
+            'database': connection.alias,
+            'view': view_name,
+            'path': self.request.path,
+            'sql': sql,
+            # У executemany параметры - список наборов; хватит первого.
+            'params': repr(list(params)[0] if many and params else params),
+            'stack': project_stack(),
+            'plan': plan,
+        }
+        logger.warning(json.dumps(entry, ensure_ascii=False))
@@ -0,0 +1,26 @@
+"""Шаблоны Django, время отрисовки которых попадает в фазу template.
+
+    TEMPLATES = [{
+        'BACKEND': 'core.template.backends.django.DjangoTemplates',
+        ...
+    }]
+"""
+from core.timing import phase
+
+from django.template.backends import django
+
+
+class Template(django.Template):
+
+    def render(self, context=None, request=None):
+        with phase('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
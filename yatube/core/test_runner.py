@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test import runner
+
+# Каталог кешей тестового прогона; воркеры --parallel наследуют его
+# при fork и берут себе по подкаталогу.
+_cache_dir = None
+
+
+def isolated_cache_settings(directory):
+    """Настройки, которые переносят кеши SQLite, метрики и стеки
+    профилировщика из CACHE_DIR сервера разработки в directory."""
+    return override_settings(
+        CACHES={
+            alias: (
+                {
+                    **config,
+                    'LOCATION': os.path.join(
+                        directory, os.path.basename(config['LOCATION'])
+                    ),
+                }
+                if config['BACKEND'] == 'core.cache.SQLiteCache'
+                else config
+            )
+            for alias, config in settings.CACHES.items()
+        },
+        METRICS_DIR=os.path.join(directory, 'metrics'),
+        PROFILER_DIR=os.path.join(directory, 'profiles'),
+    )
+
+
+def _init_worker(counter):
+    runner._init_worker(counter)
+    isolated_cache_settings(
+        os.path.join(_cache_dir, f'worker-{runner._worker_id}')
+    ).enable()
+
+
+class IsolatedParallelTestSuite(runner.ParallelTestSuite):
+    init_worker = _init_worker
+
+
+class BudgetTestRunner(runner.DiscoverRunner):
+    """Тестовый раннер, в котором превышение бюджета запросов - ошибка.
+
+    Кеши и снимки метрик тестов лежат во временном каталоге: cache.clear()
+    в тестах не трогает кеш запущенного сервера разработки.
+    """
+
+    parallel_test_suite = IsolatedParallelTestSuite
+
+    def setup_test_environment(self, **kwargs):
+        global _cache_dir
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
+        _cache_dir = tempfile.mkdtemp(prefix='yatube-tests-')
+        self._cache_settings = isolated_cache_settings(_cache_dir)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        shutil.rmtree(_cache_dir, ignore_errors=True)
+        # Снимок метрик тестового процесса при выходе никуда не пишется.
+        settings.METRICS_DIR = None
+        super().teardown_test_environment(**kwargs)
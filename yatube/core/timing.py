@@ -0,0 +1,95 @@
+"""Разбивка времени запроса по фазам для Server-Timing и лога.
+
+ServerTimingMiddleware заводит для запроса RequestTimer, а код
+отмечает свои фазы:
+
+    with phase('thumbnail'):
+        ...
+
+    @timed('cache')
+    def get(self, key):
+        ...
+
+Фаза одного имени, вложенная в саму себя, считается один раз. Фазы
+разных имён могут перекрываться: шаблон включает время миниатюр и
+кеша, которые он запросил, поэтому их сумма может быть больше общего
+времени. Вне запроса (команды, фоновые потоки) фазы ничего не стоят.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+_local = threading.local()
+
+
+class RequestTimer:
+    """Время фаз запроса и счётчики событий в нём."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.events = Counter()
+        self._depth = Counter()
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def time_ms(self, name):
+        return self.seconds[name] * 1000
+
+    def record(self, event, number=1):
+        self.events[event] += number
+
+
+def current_timer():
+    """Таймер запроса текущего потока или None."""
+    return getattr(_local, 'timer', None)
+
+
+@contextmanager
+def request_timer():
+    """Включает учёт фаз в текущем потоке на время блока."""
+    saved = current_timer()
+    timer = _local.timer = RequestTimer()
+    try:
+        yield timer
+    finally:
+        _local.timer = saved
+
+
+@contextmanager
+def phase(name):
+    """Добавляет время блока к фазе name таймера запроса."""
+    timer = current_timer()
+    if timer is None or timer._depth[name]:
+        yield
+        return
+    timer._depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.seconds[name] += time.perf_counter() - started
+        timer.calls[name] += 1
+        timer._depth[name] -= 1
+
+
+def timed(name):
+    """Декоратор: вызов функции - фаза name."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(event, number=1):
+    """Увеличивает счётчик события event в таймере запроса."""
+    timer = current_timer()
+    if timer is not None:
+        timer.record(event, number)
@@ -1,4 +1,12 @@
-from django.shortcuts import render
+from core import profiler as sampling
+from core.forms import ProfilerForm
+from core.metrics import registry
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect, render
 
 
 def page_not_found(request, exception):
@@ -7,3 +15,47 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики всех процессов для Prometheus; только METRICS_ALLOWED_IPS."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    registry.flush(force=True)
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def profiler(request):
+    """Настройка профилировщика и сводка собранных стеков."""
+    config = sampling.get_config(refresh=True)
+    form = ProfilerForm(request.POST or None, initial={
+        **config, 'views': ', '.join(config['views']),
+    })
+    if form.is_valid():
+        sampling.set_config(**form.cleaned_data)
+        return redirect('profiler')
+    stacks = sampling.store.collect(config['generation'])
+    return render(request, 'core/profiler.html', {
+        **admin.site.each_context(request),
+        'title': 'Профилировщик',
+        'form': form,
+        'samples': sum(stacks.values()),
+        'stacks': len(stacks),
+        'leaves': sampling.leaves(stacks).most_common(20),
+    })
+
+
+@staff_member_required
+def profiler_stacks(request):
+    """Стеки всех процессов в формате collapsed для flamegraph."""
+    config = sampling.get_config(refresh=True)
+    response = HttpResponse(
+        sampling.render(sampling.store.collect(config['generation'])),
+        content_type='text/plain; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'attachment; filename="stacks.txt"'
+    return response
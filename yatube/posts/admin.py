@@ -1,9 +1,21 @@
+from core.db.dates import DateHierarchyQuerySet
+from core.paginators import EstimatedCountPaginator
+
 from django.contrib import admin
 
+from .forms import PostForm
 from .models import Group, Post
+from .search import fts_enabled, match_expression, matching_ids
+
+
+class PostAdminForm(PostForm):
+    # Картинки из админки проходят ту же обработку, что и с сайта
+    class Meta(PostForm.Meta):
+        fields = '__all__'
 
 
 class PostAdmin(admin.ModelAdmin):
+    form = PostAdminForm
     # Перечисляем поля, которые должны отображаться в админке
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     # позволит изменять поле group в любом посте без лишних движений мышкой,
@@ -15,6 +27,39 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     # Это свойство сработает для всех колонок: где пусто — там будет эта строка
     empty_value_display = '-пусто-'
+    # Навигация по датам: годы и месяцы ищутся прыжками по индексу
+    # post_pub_date_idx (см. get_queryset), фильтры - диапазоны по нему же
+    date_hierarchy = 'pub_date'
+    list_select_related = ('author', 'group')
+    # Большие выборки не пересчитываются COUNT(*) на каждой странице,
+    # а общее число постов без фильтров не считается вовсе
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return DateHierarchyQuerySet.wrap(super().get_queryset(request))
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        # Форма сообщает об оборванной по размеру загрузке картинки
+        form.request = request
+        return form
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Список групп читается один раз, а не в каждой строке
+            # list_editable; iter() - чтобы list() не спрашивал COUNT(*)
+            field.choices = list(iter(field.choices))
+        return field
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идёт по индексу FTS5 вместо LIKE '%...%' по всей таблице
+        if not match_expression(search_term) or not fts_enabled():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=matching_ids(search_term)), False
 
 
 # При регистрации модели Post источником конфигурации для неё назначаем
@@ -0,0 +1,274 @@
+"""Замеры страниц из posts/urls.py на данных из базы.
+
+Для каждого маршрута есть сценарий: кто открывает страницу, с какими
+аргументами и каким методом. Запросы выполняются тестовым клиентом в
+текущем процессе; у каждого замеряются время, число, время и повторы
+SQL-запросов, а у нескольких - пик выделенной памяти (tracemalloc
+сильно замедляет код, поэтому время с ним не меряется). Запросы,
+которые пишут в базу, выполняются в транзакции и откатываются, чтобы
+прогоны были одинаковыми.
+"""
+import math
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+from core.queries import QueryStats
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import urls
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .search import WORD_RE
+
+Scenario = namedtuple('Scenario', 'name method url user data rollback')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def percentile(values, share):
+    """Значение, которого не превышает доля share замеров."""
+    ordered = sorted(values)
+    index = max(math.ceil(share * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def _top(queryset, field):
+    return queryset.order_by(f'-{field}', 'pk').first()
+
+
+class Fixtures:
+    """Типичные объекты для сценариев: самые активные и популярные."""
+
+    def __init__(self):
+        stats = UserStats.objects.select_related('user')
+        author = _top(stats, 'posts_count')
+        reader = _top(stats, 'following_count')
+        self.group = _top(Group.objects.all(), 'posts_count')
+        self.post = _top(Post.objects.all(), 'comments_count')
+        if None in (author, reader, self.group, self.post):
+            raise BenchmarkError(
+                'В базе нет данных: запустите generate_fake_data'
+            )
+        self.author = author.user
+        self.reader = reader.user
+        self.followed = Follow.objects.filter(
+            user=self.reader
+        ).order_by('pk').values_list('author__username', flat=True).first()
+        self.not_followed = User.objects.exclude(pk=self.reader.pk).exclude(
+            pk__in=Follow.objects.filter(user=self.reader).values('author')
+        ).order_by('pk').values_list('username', flat=True).first()
+        words = [word for word in WORD_RE.findall(self.post.text)
+                 if len(word) > 3]
+        self.word = words[0] if words else 'пост'
+
+    def scenarios(self):
+        post_id = self.post.pk
+        author_post = Post.objects.filter(author=self.author).first()
+        return {
+            'index': ('GET', (), None, None),
+            'group_list': ('GET', (self.group.slug,), None, None),
+            'profile': ('GET', (self.author.username,), None, None),
+            'post_detail': ('GET', (post_id,), None, None),
+            'post_create': ('GET', (), self.author, None),
+            'post_edit': ('GET', (author_post.pk,), self.author, None),
+            'post_comments': ('GET', (post_id,), None, None),
+            'add_comment': (
+                'POST', (post_id,), self.reader, {'text': 'Комментарий'}
+            ),
+            'search': ('GET', (), None, {'q': self.word}),
+            'follow_index': ('GET', (), self.reader, None),
+            'profile_follow': (
+                'GET', (self.not_followed or self.author.username,),
+                self.reader, None,
+            ),
+            'profile_unfollow': (
+                'GET', (self.followed or self.author.username,),
+                self.reader, None,
+            ),
+        }
+
+
+# Маршруты, которые пишут в базу: их запросы откатываются.
+WRITING = {'add_comment', 'profile_follow', 'profile_unfollow'}
+
+
+def build_scenarios(names=None):
+    """Сценарии для всех маршрутов posts/urls.py или только для names."""
+    known = Fixtures().scenarios()
+    routes = [pattern.name for pattern in urls.urlpatterns]
+    missing = set(routes) - set(known)
+    if missing:
+        raise BenchmarkError(
+            f'Нет сценария для маршрутов: {", ".join(sorted(missing))}'
+        )
+    unknown = set(names or ()) - set(routes)
+    if unknown:
+        raise BenchmarkError(
+            f'Неизвестные маршруты: {", ".join(sorted(unknown))}'
+        )
+    scenarios = []
+    for name in routes:
+        if names and name not in names:
+            continue
+        method, args, user, data = known[name]
+        scenarios.append(Scenario(
+            name=name,
+            method=method,
+            url=reverse(f'{urls.app_name}:{name}', args=args),
+            user=user,
+            data=data,
+            rollback=name in WRITING,
+        ))
+    return scenarios
+
+
+@contextmanager
+def _maybe_rollback(enabled):
+    if not enabled:
+        yield
+        return
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def _client(user, clients):
+    if user not in clients:
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        clients[user] = client
+    return clients[user]
+
+
+def _request(client, scenario):
+    with _maybe_rollback(scenario.rollback):
+        if scenario.method == 'POST':
+            return client.post(scenario.url, scenario.data or {})
+        return client.get(scenario.url, scenario.data or {})
+
+
+def measure(scenario, client, requests, warmup=0, memory_samples=0,
+            cold=False):
+    """Результаты сценария: перцентили времени, запросы, память."""
+    timings, queries, query_times, duplicates = [], [], [], []
+    status = None
+    for number in range(warmup + requests):
+        if cold:
+            cache.clear()
+        with QueryStats().track() as stats:
+            started = time.perf_counter()
+            response = _request(client, scenario)
+            elapsed = time.perf_counter() - started
+        status = response.status_code
+        if number >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(stats.count)
+            query_times.append(stats.time_ms)
+            duplicates.append(stats.duplicates)
+    peaks = []
+    for _ in range(memory_samples):
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            _request(client, scenario)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return {
+        'method': scenario.method,
+        'url': scenario.url,
+        'status': status,
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': statistics.median(queries),
+        'query_ms': round(statistics.median(query_times), 3),
+        'duplicates': statistics.median(duplicates),
+        'peak_memory_kib': (
+            round(max(peaks) / 1024) if peaks else None
+        ),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Что нужно знать, чтобы сравнивать прогоны между коммитами."""
+    return {
+        'commit': _commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': {
+            model._meta.model_name: model.objects.count()
+            for model in (User, Group, Post, Comment, Follow)
+        },
+    }
+
+
+def run(names=None, requests=30, warmup=3, memory_samples=3, cold=False,
+        progress=None):
+    """Прогоняет сценарии и возвращает отчёт для сохранения в JSON."""
+    # Как в продакшене: без журнала запросов DEBUG.
+    with override_settings(DEBUG=False):
+        scenarios = build_scenarios(names)
+        clients = {}
+        results = {}
+        for scenario in scenarios:
+            results[scenario.name] = measure(
+                scenario, _client(scenario.user, clients), requests,
+                warmup=warmup, memory_samples=memory_samples, cold=cold,
+            )
+            if progress is not None:
+                progress(scenario.name, results[scenario.name])
+    return {
+        **environment(),
+        'options': {
+            'requests': requests,
+            'warmup': warmup,
+            'memory_samples': memory_samples,
+            'cold': cold,
+        },
+        'scenarios': results,
+    }
+
+
+def compare(previous, current):
+    """Строки (маршрут, метрика, было, стало, изменение в %)."""
+    rows = []
+    for name, result in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries'):
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            rows.append((name, metric, old, new, change))
+    return rows
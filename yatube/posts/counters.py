@@ -0,0 +1,101 @@
+"""Денормализованные счётчики постов, комментариев, подписок и ссылок.
+
+Счётчики меняются атомарными UPDATE ... SET x = x + 1 из сигналов
+создания и удаления объектов; recount_all пересчитывает их заново.
+UPDATE не шлёт post_save, поэтому копии групп и постов в кеше объектов
+сбрасываются здесь же.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post, StoredFile, UserStats
+from .object_cache import invalidate_pk, object_cache
+
+User = get_user_model()
+
+
+def change(queryset, **deltas):
+    """Атомарно прибавляет deltas к полям-счётчикам выборки."""
+    return queryset.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def change_user_stats(user_id, **deltas):
+    if not change(UserStats.objects.filter(user_id=user_id), **deltas):
+        if User.objects.filter(pk=user_id).exists():
+            UserStats.objects.get_or_create(user_id=user_id)
+            change(UserStats.objects.filter(user_id=user_id), **deltas)
+
+
+def change_group_posts(group_id, delta):
+    if group_id:
+        change(Group.objects.filter(pk=group_id), posts_count=delta)
+        invalidate_pk(Group, group_id)
+
+
+def change_post_comments(post_id, delta):
+    change(Post.objects.filter(pk=post_id), comments_count=delta)
+    invalidate_pk(Post, post_id)
+
+
+def change_file_references(name, delta):
+    """Меняет число постов, ссылающихся на файл картинки name.
+
+    modified обновляется явно: по нему сборщик мусора отличает только
+    что освободившиеся файлы, а update() не заполняет auto_now.
+    """
+    if not name:
+        return
+    files = StoredFile.objects.filter(name=name)
+    changes = {
+        'references': F('references') + delta,
+        'modified': timezone.now(),
+    }
+    if not files.update(**changes) and delta > 0:
+        _, created = StoredFile.objects.get_or_create(
+            name=name, defaults={'references': delta}
+        )
+        if not created:
+            files.update(**changes)
+
+
+def _count(model, field, outer='pk'):
+    """Подзапрос с числом строк model, у которых field = внешнему outer."""
+    rows = model.objects.filter(
+        **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), Value(0))
+
+
+def recount_all():
+    """Пересчитывает все счётчики по фактическим данным."""
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=pk)
+            for pk in User.objects.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True)
+        ),
+        ignore_conflicts=True,
+    )
+    UserStats.objects.update(
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+    Group.objects.update(posts_count=_count(Post, 'group'))
+    Post.objects.update(comments_count=_count(Comment, 'post'))
+    StoredFile.objects.bulk_create(
+        (
+            StoredFile(name=name)
+            for name in Post.objects.exclude(image='').values_list(
+                'image', flat=True
+            ).distinct()
+        ),
+        ignore_conflicts=True,
+    )
+    StoredFile.objects.update(references=_count(Post, 'image', 'name'))
+    object_cache.clear()
@@ -0,0 +1,264 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Активность и популярность пользователей распределены по степенному
+закону (Ципфа): немногие авторы пишут больше всех и собирают почти всех
+подписчиков, у большинства постов почти нет комментариев. Строки
+вставляются bulk_create пачками, без сигналов, а счётчики и ленты
+подписок затем строятся целиком.
+"""
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from .counters import recount_all
+from .models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+from .timelines import promote_celebrities
+
+User = get_user_model()
+
+# Пачка генерации; размер INSERT Django подбирает сам под лимиты SQLite.
+BATCH_SIZE = 2000
+# Тексты берутся из заранее созданного набора: Faker медленный.
+TEXT_POOL = 1000
+GROUP_SHARE = 0.7
+FOLLOW_ATTEMPTS = 20
+
+
+class PowerLaw:
+    """Выбор элементов с весами 1 / rank ** exponent.
+
+    Ранги назначаются в случайном порядке, чтобы популярность не
+    зависела от id.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+        self.rng = rng
+
+    def sample(self, k):
+        return self.rng.choices(self.items, cum_weights=self.weights, k=k)
+
+
+@contextmanager
+def keep_pub_date(*models):
+    """bulk_create сохраняет заданные pub_date, а не текущее время."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _batches(total):
+    for start in range(0, total, BATCH_SIZE):
+        yield start, min(BATCH_SIZE, total - start)
+
+
+def _new_ids(model, after):
+    return list(
+        model.objects.filter(pk__gt=after).order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+
+def _last_id(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+class FakeDataGenerator:
+    """Наполняет базу пользователями, группами, постами и подписками."""
+
+    def __init__(self, exponent=1.1, days=730, seed=None, log=None):
+        self.exponent = exponent
+        self.rng = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.log = log or (lambda message: None)
+
+    def power_law(self, items):
+        return PowerLaw(items, self.exponent, self.rng)
+
+    def texts(self, make):
+        return [make() for _ in range(TEXT_POOL)]
+
+    def generate(self, users, groups, posts, comments, follows):
+        user_ids = self.create_users(users)
+        group_ids = self.create_groups(groups)
+        post_ids, post_times = self.create_posts(
+            posts, self.power_law(user_ids), self.power_law(group_ids)
+        )
+        self.create_comments(
+            comments, post_ids, post_times, self.power_law(user_ids)
+        )
+        # Ранги популярности не связаны с числом постов: иначе ленты
+        # подписок (подписчики x посты автора) растут на порядки.
+        self.create_follows(
+            follows, self.power_law(user_ids), self.power_law(user_ids)
+        )
+        with transaction.atomic():
+            recount_all()
+            promote_celebrities()
+        self.log('Счётчики пересчитаны')
+        self.log(f'Записей в лентах: {self.fill_timelines(user_ids)}')
+
+    @transaction.atomic
+    def create_users(self, total):
+        last = _last_id(User)
+        User.objects.bulk_create(
+            (
+                User(username=f'fake{last + number}', password='!')
+                for number in range(1, total + 1)
+            ),
+        )
+        user_ids = _new_ids(User, last)
+        UserStats.objects.bulk_create(
+            (UserStats(user_id=pk) for pk in user_ids),
+        )
+        self.log(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    @transaction.atomic
+    def create_groups(self, total):
+        last = _last_id(Group)
+        Group.objects.bulk_create(
+            Group(
+                title=self.faker.sentence(nb_words=3)[:200],
+                slug=f'fake-{last + number}',
+                description=self.faker.paragraph(),
+            )
+            for number in range(1, total + 1)
+        )
+        group_ids = _new_ids(Group, last)
+        self.log(f'Групп: {len(group_ids)}')
+        return group_ids
+
+    def create_posts(self, total, authors, groups):
+        """Посты по возрастанию даты; возвращает их id и время."""
+        texts = self.texts(lambda: self.faker.paragraph(
+            nb_sentences=self.rng.randint(1, 8)
+        ))
+        last = _last_id(Post)
+        start = self.start.timestamp()
+        step = (self.now.timestamp() - start) / max(total, 1)
+        times = array('d')
+        with keep_pub_date(Post), transaction.atomic():
+            for offset, size in _batches(total):
+                batch_authors = authors.sample(size)
+                batch_groups = groups.sample(size) if groups.items else []
+                rows = []
+                for index in range(size):
+                    moment = start + step * (
+                        offset + index + self.rng.random()
+                    )
+                    times.append(moment)
+                    group_id = None
+                    if batch_groups and self.rng.random() < GROUP_SHARE:
+                        group_id = batch_groups[index]
+                    rows.append(Post(
+                        text=self.rng.choice(texts),
+                        author_id=batch_authors[index],
+                        group_id=group_id,
+                        pub_date=_aware(moment),
+                    ))
+                Post.objects.bulk_create(rows)
+        post_ids = _new_ids(Post, last)
+        self.log(f'Постов: {len(post_ids)}')
+        return post_ids, times
+
+    def create_comments(self, total, post_ids, post_times, authors):
+        if not post_ids:
+            return
+        texts = self.texts(self.faker.sentence)
+        posts = self.power_law(range(len(post_ids)))
+        now = self.now.timestamp()
+        with keep_pub_date(Comment), transaction.atomic():
+            for _, size in _batches(total):
+                batch_authors = authors.sample(size)
+                rows = []
+                for index, position in enumerate(posts.sample(size)):
+                    created = post_times[position]
+                    # Большая часть комментариев - вскоре после поста.
+                    moment = created + (
+                        (now - created) * self.rng.random() ** 4
+                    )
+                    rows.append(Comment(
+                        post_id=post_ids[position],
+                        author_id=batch_authors[index],
+                        text=self.rng.choice(texts),
+                        pub_date=_aware(moment),
+                    ))
+                Comment.objects.bulk_create(rows)
+        self.log(f'Комментариев: {total}')
+
+    @transaction.atomic
+    def create_follows(self, total, readers, authors):
+        """Уникальные подписки без подписок на себя."""
+        pairs = set(Follow.objects.values_list('user_id', 'author_id'))
+        existing = len(pairs)
+        possible = len(readers.items) * (len(readers.items) - 1)
+        target = min(existing + total, possible)
+        # Попытки ограничены: у популярных пар много повторов.
+        for _ in range(FOLLOW_ATTEMPTS):
+            needed = target - len(pairs)
+            if needed <= 0:
+                break
+            for pair in zip(
+                readers.sample(2 * needed), authors.sample(2 * needed)
+            ):
+                if pair[0] != pair[1]:
+                    pairs.add(pair)
+                    if len(pairs) == target:
+                        break
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in pairs
+            ),
+            ignore_conflicts=True,
+        )
+        self.log(f'Подписок: {len(pairs) - existing}')
+
+    @transaction.atomic
+    def fill_timelines(self, user_ids):
+        """Ленты новых читателей одним INSERT ... SELECT, как fan-out.
+
+        Посты знаменитостей в ленты не попадают, см. posts.timelines.
+        """
+        if not user_ids:
+            return 0
+        timeline = TimelineEntry._meta.db_table
+        follow = Follow._meta.db_table
+        post = Post._meta.db_table
+        stats = UserStats._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {timeline} (user_id, post_id, pub_date) '
+                f'SELECT f.user_id, p.id, p.pub_date FROM {follow} f '
+                f'JOIN {stats} s ON s.user_id = f.author_id '
+                f'JOIN {post} p ON p.author_id = f.author_id '
+                f'WHERE NOT s.is_celebrity '
+                f'AND f.user_id BETWEEN %s AND %s',
+                (user_ids[0], user_ids[-1]),
+            )
+            return cursor.rowcount
+
+
+def _aware(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
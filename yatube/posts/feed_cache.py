@@ -0,0 +1,204 @@
+import hashlib
+import time
+import uuid
+from contextlib import nullcontext
+from functools import wraps
+
+from core.db.routers import pin_primary
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+ANONYMOUS = 'anon'
+AUTHENTICATED = 'auth'
+# Параметры запроса, которые выбирают страницу ленты или комментариев.
+PAGE_PARAMS = ('page', 'cursor', 'comments')
+
+
+def _version_key(scope):
+    return f'feed_version:{scope}'
+
+
+def _new_version():
+    """Случайный токен версии с временем изменения в конце."""
+    return f'{uuid.uuid4().hex}.{int(time.time())}'
+
+
+def version_time(version):
+    """Время изменения области по её токену версии."""
+    return int(version.rpartition('.')[2])
+
+
+def feed_versions(*scopes):
+    """Текущие версии областей кеша; отсутствующие создаются заново.
+
+    Версия - случайный токен, а не счётчик: если ключ версии вытеснен
+    из кеша, новый токен не совпадёт ни с одной сохранённой страницей.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return {
+        scope: versions[key] for scope, key in zip(scopes, keys)
+    }
+
+
+def bump_feed_versions(*scopes):
+    """Инвалидирует все страницы и фрагменты, зависящие от областей."""
+    cache.set_many(
+        {_version_key(scope): _new_version() for scope in set(scopes)},
+        None,
+    )
+
+
+def depend_on(request, *scopes):
+    """Добавляет к кешируемой странице зависимости, известные только view."""
+    request.feed_dependencies.update(feed_versions(*scopes))
+
+
+def feed_audience(request):
+    """Аудитория ленты: анонимный или авторизованный посетитель."""
+    if request.user.is_authenticated:
+        return AUTHENTICATED
+    return ANONYMOUS
+
+
+def feed_page_key(request):
+    """Короткий ключ открытой страницы: номера и курсоры из запроса."""
+    raw = '&'.join(
+        f'{param}={request.GET.get(param, "")}' for param in PAGE_PARAMS
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def feed_fragment_key(request, *scopes):
+    """Ключ фрагмента ленты для тега {% cache %} в шаблоне."""
+    return ':'.join((
+        *feed_versions(*scopes).values(),
+        feed_audience(request),
+        feed_page_key(request),
+    ))
+
+
+def feed_validators(request, key, versions, dependencies):
+    """ETag и время последнего изменения страницы по версиям её областей.
+
+    Для авторизованного посетителя в ETag входят его id, версия его
+    подписок, CSRF-токен и хеш пароля из сессии: от них зависят шапка,
+    кнопка подписки и токены в формах страницы.
+    """
+    versions = {**versions, **dependencies}
+    parts = [key]
+    if feed_audience(request) != ANONYMOUS:
+        user_id = request.user.pk
+        versions.update(feed_versions(f'follow:{user_id}'))
+        parts += [
+            user_id,
+            request.META.get('CSRF_COOKIE'),
+            request.session.get(HASH_SESSION_KEY),
+        ]
+    parts += sorted(versions.items())
+    etag = hashlib.md5(repr(parts).encode()).hexdigest()
+    last_modified = max(map(version_time, versions.values()))
+    return f'W/"{etag}"', last_modified
+
+
+def last_modified_header(last_modified):
+    """Заголовок Last-Modified для страницы, изменённой в last_modified.
+
+    Время версии точно до секунды: изменение в ту же секунду после
+    ответа If-Modified-Since не заметил бы. Пока эта секунда не прошла,
+    отдаётся секундой раньше - повтор получит 200, а не старую копию.
+    """
+    if last_modified >= int(time.time()):
+        last_modified -= 1
+    return http_date(last_modified)
+
+
+def recently_changed(versions):
+    """Менялась ли область недавно, так что реплики могут отставать."""
+    changed = max(map(version_time, versions.values()), default=0)
+    return time.time() - changed < settings.REPLICA_MAX_LAG
+
+
+def cache_feed(key_prefix, timeout, *scopes):
+    """Кэширует готовую страницу ленты и отвечает 304 на повторы.
+
+    В отличие от cache_page ключ не зависит от cookies, а учитывает
+    аргументы view, страницу (параметры PAGE_PARAMS) и версии областей
+    scopes - шаблонов вида 'group:{slug}', заполняемых аргументами view.
+    Зависимости, добавленные во view через depend_on, проверяются при
+    каждом попадании в кеш. Целиком страница хранится только для
+    анонимных посетителей, для остальных - лишь её зависимости, чтобы
+    ответить 304 Not Modified, не выполняя view. Страница недавно
+    изменённой области строится по основной базе: иначе в кеш под новой
+    версией попала бы устаревшая копия с реплики.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.feed_dependencies = {}
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            anonymous = feed_audience(request) == ANONYMOUS
+            versions = feed_versions(
+                *(scope.format(**kwargs) for scope in scopes)
+            )
+            key = ':'.join((
+                'feed',
+                key_prefix,
+                feed_audience(request),
+                *map(str, args),
+                *map(str, kwargs.values()),
+                *versions.values(),
+                feed_page_key(request),
+            ))
+            cached = cache.get(key)
+            if cached is not None:
+                dependencies, response = cached
+                if (
+                    not dependencies
+                    or feed_versions(*dependencies) == dependencies
+                ):
+                    etag, last_modified = feed_validators(
+                        request, key, versions, dependencies
+                    )
+                    not_modified = get_conditional_response(
+                        request, etag=etag, last_modified=last_modified
+                    )
+                    if not_modified is not None:
+                        not_modified['ETag'] = etag
+                        return not_modified
+                    if response is not None:
+                        response['Last-Modified'] = last_modified_header(
+                            last_modified
+                        )
+                        return response
+            routing = (
+                pin_primary() if recently_changed(versions) else nullcontext()
+            )
+            with routing:
+                response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                dependencies = request.feed_dependencies
+                etag, last_modified = feed_validators(
+                    request, key, versions, dependencies
+                )
+                response['ETag'] = etag
+                response['Last-Modified'] = last_modified_header(
+                    last_modified
+                )
+                cache.set(
+                    key,
+                    (dependencies, response if anonymous else None),
+                    timeout,
+                )
+            return response
+        return wrapper
+    return decorator
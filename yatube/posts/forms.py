@@ -1,14 +1,43 @@
 from django import forms
 
 from .models import Comment, Post
+from .uploads import add_upload_errors, check_size, normalize_image
+
+
+class NormalizedImageField(forms.ImageField):
+    """Поле картинки с ограничением размера и очисткой загрузки."""
+
+    def to_python(self, data):
+        if data:
+            check_size(data)
+        image = super().to_python(data)
+        if image is None:
+            return None
+        return normalize_image(image)
 
 
 class PostForm(forms.ModelForm):
+    # Запрос, разбор которого мог оборвать LimitedUploadHandler: тогда
+    # картинки нет в files, и форма сообщает, что файл слишком большой.
+    request = None
+
+    def __init__(self, *args, request=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if request is not None:
+            self.request = request
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.request is not None:
+            add_upload_errors(self.request, self)
+        return cleaned_data
+
     class Meta:
         model = Post
         fields = ('group', 'text', 'image')
         labels = {'text': 'Введите текст', 'group': 'Выберите группу'}
         help_text = {'text': 'Любой текст', 'group': 'Из уже существующих'}
+        field_classes = {'image': NormalizedImageField}
 
 
 class CommentForm(forms.ModelForm):
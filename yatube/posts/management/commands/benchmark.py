@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа, SQL-запросы и память страниц '
+        'из posts/urls.py; данные - из generate_fake_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'routes', nargs='*',
+            help='Имена маршрутов; по умолчанию все',
+        )
+        parser.add_argument('--requests', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--memory-samples', type=int, default=3)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument('--output', help='Файл для отчёта JSON')
+        parser.add_argument(
+            '--compare', help='Отчёт JSON прошлого прогона для сравнения',
+        )
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)
+        self.stdout.write(
+            f'{"маршрут":<18} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"запросов":>9} {"память, КиБ":>12}'
+        )
+        try:
+            report = benchmark.run(
+                names=options['routes'],
+                requests=options['requests'],
+                warmup=options['warmup'],
+                memory_samples=options['memory_samples'],
+                cold=options['cold'],
+                progress=self.progress,
+            )
+        except benchmark.BenchmarkError as error:
+            raise CommandError(error)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Отчёт сохранён в {options["output"]}')
+        if previous is not None:
+            self.stdout.write(f'\nСравнение с {previous.get("commit")}:')
+            for name, metric, old, new, change in benchmark.compare(
+                previous, report
+            ):
+                self.stdout.write(
+                    f'{name:<18} {metric:<8} {old:>10} -> {new:<10} '
+                    f'{change:+.1f}%'
+                )
+
+    def progress(self, name, result):
+        memory = result['peak_memory_kib']
+        self.stdout.write(
+            f'{name:<18} {result["p50_ms"]:>9.1f} {result["p95_ms"]:>9.1f} '
+            f'{result["queries"]:>9} {"-" if memory is None else memory:>12}'
+        )
@@ -0,0 +1,63 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post, StoredFile
+
+
+def walk(storage, path):
+    """Все файлы в каталоге хранилища и его подкаталогах."""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки постов, на которые больше нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не удалять файлы, изменённые за столько секунд',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+
+    def handle(self, *args, min_age, dry_run, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        if not storage.exists(field.upload_to):
+            return
+        cutoff = timezone.now() - timedelta(seconds=min_age)
+        live = set(StoredFile.objects.filter(
+            references__gt=0
+        ).values_list('name', flat=True))
+        removed = 0
+        for name in walk(storage, field.upload_to.rstrip('/')):
+            if name in live or storage.get_modified_time(name) > cutoff:
+                continue
+            # Счётчик мог разойтись с данными: проверяем сами посты.
+            if Post.objects.filter(image=name).exists():
+                continue
+            files = StoredFile.objects.filter(name=name)
+            if files.filter(modified__gte=cutoff).exists():
+                continue
+            if not dry_run:
+                files.filter(references__lte=0).delete()
+                delete(ImageFile(name, storage))
+            self.stdout.write(name)
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {removed}'
+        ))
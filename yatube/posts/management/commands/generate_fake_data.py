@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.fake_data import FakeDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт пользователей, посты, комментарии и подписки '
+        'со степенным распределением активности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20_000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=2_000_000)
+        parser.add_argument('--follows', type=int, default=200_000)
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степени распределения Ципфа',
+        )
+        parser.add_argument(
+            '--days', type=int, default=730,
+            help='За сколько дней распределены даты постов',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        generator = FakeDataGenerator(
+            exponent=options['exponent'],
+            days=options['days'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
+        generator.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.0f} с'
+        ))
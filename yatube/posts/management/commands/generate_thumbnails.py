@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для уже загруженных картинок постов'
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        count = 0
+        for name in names.iterator():
+            thumbnails.pregenerate(ImageFile(name, storage))
+            count += 1
+        thumbnails.wait()
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок обработано: {count}'
+        ))
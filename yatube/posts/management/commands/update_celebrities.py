@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import timelines
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает статус знаменитостей; ленты подписчиков бывших '
+        'знаменитостей дополняются их постами'
+    )
+
+    def handle(self, *args, **options):
+        promoted, demoted = timelines.update_celebrities()
+        self.stdout.write(self.style.SUCCESS(
+            f'Новых знаменитостей: {len(promoted)}, '
+            f'бывших: {len(demoted)}'
+        ))
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# Полнотекстовый индекс постов: rowid совпадает с id поста, group_title
+# хранит название группы. Индекс поддерживается триггерами, поэтому
+# bulk_create, update() и правки из консоли тоже попадают в поиск.
+GROUP_TITLE = (
+    "COALESCE((SELECT title FROM posts_group WHERE id = new.group_id), '')"
+)
+
+FORWARD_SQL = (
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, group_title, tokenize = 'unicode61 remove_diacritics 2')",
+
+    "INSERT INTO posts_post_fts (rowid, text, group_title) "
+    "SELECT p.id, p.text, COALESCE(g.title, '') "
+    "FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id",
+
+    "CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN "
+    "INSERT INTO posts_post_fts (rowid, text, group_title) "
+    f"VALUES (new.id, new.text, {GROUP_TITLE}); END",
+
+    "CREATE TRIGGER posts_post_fts_update "
+    "AFTER UPDATE OF text, group_id ON posts_post BEGIN "
+    f"UPDATE posts_post_fts SET text = new.text, group_title = {GROUP_TITLE} "
+    "WHERE rowid = new.id; END",
+
+    "CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN "
+    "DELETE FROM posts_post_fts WHERE rowid = old.id; END",
+
+    "CREATE TRIGGER posts_group_fts_update "
+    "AFTER UPDATE OF title ON posts_group BEGIN "
+    "UPDATE posts_post_fts SET group_title = new.title WHERE rowid IN "
+    "(SELECT id FROM posts_post WHERE group_id = new.id); END",
+)
+
+REVERSE_SQL = (
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+)
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(FORWARD_SQL),
+            run_on_sqlite(REVERSE_SQL),
+        ),
+    ]
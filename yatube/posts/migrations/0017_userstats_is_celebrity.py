@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:10
+
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(followers_count__gte=1000).update(
+        is_celebrity=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_timeline_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='is_celebrity',
+            field=models.BooleanField(default=False, verbose_name='Знаменитость'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+"""Read-through кеш объектов Post, Group и User по ключу.
+
+Объект хранится под ключом pk, а ключи slug и username хранят только
+ссылку на pk. Ссылка проверяется при чтении, поэтому после
+переименования старая ссылка не вернёт чужой объект. Вытеснением
+занимается кеш 'objects' (LRU с ограничением MAX_ENTRIES).
+
+Кеш лежит на диске, поэтому пользователь хранится без хеша пароля,
+почты и прав - только с полями, которые выводят шаблоны.
+"""
+from core.cache import CacheProxy
+
+from django.contrib.auth import get_user_model
+from django.http import Http404
+
+from .models import Group, Post
+
+User = get_user_model()
+
+OBJECT_CACHE_TIME = 60 * 15
+# Поля, по которым объекты можно искать через кеш, кроме pk.
+NATURAL_KEYS = {
+    Post: (),
+    Group: ('slug',),
+    User: ('username',),
+}
+# Поля, которые загружаются и кешируются; для остальных моделей - все.
+CACHED_FIELDS = {
+    User: ('username', 'first_name', 'last_name'),
+}
+
+object_cache = CacheProxy('objects')
+
+
+def _key(model, field, value):
+    return f'object:{model._meta.label_lower}:{field}:{value}'
+
+
+def _fetch(model, field, value):
+    queryset = model._default_manager.all()
+    if model in CACHED_FIELDS:
+        queryset = queryset.only(*CACHED_FIELDS[model])
+    obj = queryset.get(**{field: value})
+    object_cache.set_many({
+        _key(model, 'pk', obj.pk): obj,
+        **{
+            _key(model, name, getattr(obj, name)): obj.pk
+            for name in NATURAL_KEYS[model]
+        },
+    }, OBJECT_CACHE_TIME)
+    return obj
+
+
+def get_cached_object(model, **lookup):
+    """Ищет объект по pk или естественному ключу, сначала в кеше.
+
+    Как и QuerySet.get, бросает model.DoesNotExist.
+    """
+    (field, value), = lookup.items()
+    if field == 'pk':
+        return (
+            object_cache.get(_key(model, 'pk', value))
+            or _fetch(model, 'pk', value)
+        )
+    if field not in NATURAL_KEYS[model]:
+        raise ValueError(f'{model.__name__} не кешируется по {field}')
+    pk = object_cache.get(_key(model, field, value))
+    if pk is not None:
+        try:
+            obj = get_cached_object(model, pk=pk)
+        except model.DoesNotExist:
+            obj = None
+        if obj is not None and getattr(obj, field) == value:
+            return obj
+    return _fetch(model, field, value)
+
+
+def get_cached_object_or_404(model, **lookup):
+    try:
+        return get_cached_object(model, **lookup)
+    except model.DoesNotExist:
+        raise Http404(f'{model._meta.object_name} не найден')
+
+
+def invalidate_object(instance):
+    """Сбрасывает запись объекта и ссылки на него по текущим ключам.
+
+    Ссылки сбрасываются на случай, если slug или username освободился
+    без сигналов (например, при очистке таблицы) и занят новым объектом.
+    """
+    model = type(instance)
+    object_cache.delete_many([
+        _key(model, 'pk', instance.pk),
+        *(
+            _key(model, name, getattr(instance, name))
+            for name in NATURAL_KEYS[model]
+        ),
+    ])
+
+
+def invalidate_pk(model, pk):
+    """Сбрасывает запись объекта по pk.
+
+    Нужна после queryset.update(), который не шлёт post_save:
+    например, когда меняются денормализованные счётчики. Ссылки по
+    естественным ключам остаются: они проверяются при чтении.
+    """
+    object_cache.delete(_key(model, 'pk', pk))
+
+
+def get_cached_post_or_404(post_id, user=None):
+    """Пост вместе с автором и группой, взятыми из кеша.
+
+    user - посетитель, уже загруженный аутентификацией: если это автор
+    поста, он не ищется второй раз.
+    """
+    post = get_cached_object_or_404(Post, pk=post_id)
+    if user is not None and user.pk == post.author_id:
+        post.author = user
+    else:
+        post.author = get_cached_object(User, pk=post.author_id)
+    if post.group_id:
+        post.group = get_cached_object(Group, pk=post.group_id)
+    return post
@@ -0,0 +1,76 @@
+"""Полнотекстовый поиск постов по индексу SQLite FTS5.
+
+Таблица posts_post_fts создаётся миграцией 0014 и поддерживается
+триггерами. На других СУБД поиск откатывается к icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+# Маркеры совпадений в snippet(): экранируются отдельно от текста.
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 16
+WORD_RE = re.compile(r'\w+')
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос MATCH.
+
+    Каждое слово ищется как префикс, все слова должны найтись.
+    """
+    words = WORD_RE.findall(query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match_expression(query),),
+    )
+
+
+def search_posts(query):
+    """Посты по релевантности (bm25) с фрагментом текста в snippet."""
+    if not match_expression(query):
+        return Post.objects.none()
+    if not fts_enabled():
+        return Post.objects.filter(
+            Q(text__icontains=query) | Q(group__title__icontains=query)
+        ).extra(select={'snippet': 'posts_post.text'})
+    return Post.objects.extra(
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = posts_post.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[match_expression(query)],
+        select={
+            'rank': f'bm25({FTS_TABLE}, 1.0, 0.5)',
+            'snippet': (
+                f"snippet({FTS_TABLE}, 0, '{MARK_START}', '{MARK_END}', "
+                f"'…', {SNIPPET_TOKENS})"
+            ),
+        },
+    ).order_by('rank', '-pub_date')
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и выделяет совпадения тегом <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
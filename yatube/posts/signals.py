@@ -0,0 +1,200 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, thumbnails, timelines
+from .feed_cache import bump_feed_versions
+from .models import Comment, Follow, Group, Post, UserStats
+from .object_cache import invalidate_object
+
+User = get_user_model()
+
+
+def follower_scopes(author_id, followers=None):
+    """Области кеша лент подписок всех подписчиков автора.
+
+    Ленты подписчиков знаменитостей зависят от области 'author:<id>'.
+    followers - уже прочитанный timelines.fan_out_followers автора.
+    """
+    if followers is None:
+        followers = timelines.fan_out_followers(author_id)
+    return [f'follow:{user_id}' for user_id in followers]
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_object(sender, instance, **kwargs):
+    invalidate_object(instance)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминает прежние группу и картинку, чтобы обновить счётчики.
+
+    Прежняя группа нужна ещё и для сброса кеша её ленты.
+    """
+    previous = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', 'group__slug', 'image'
+    ).first() if instance.pk else None
+    instance._previous_group = (
+        previous[:2] if previous and previous[0] else None
+    )
+    instance._previous_image = previous[2] if previous else ''
+
+
+# Счётчики и ленты обновляются раньше, чем сбрасывается их кеш.
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_group', None)
+    previous_id = previous[0] if previous else None
+    if created:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+    elif previous_id == instance.group_id:
+        return
+    counters.change_group_posts(previous_id, -1)
+    counters.change_group_posts(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+    counters.change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    if previous != instance.image.name:
+        counters.change_file_references(instance.image.name, 1)
+        counters.change_file_references(previous, -1)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    counters.change_file_references(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        # Те же подписчики нужны invalidate_post_feeds.
+        instance._followers = timelines.fan_out_followers(instance.author_id)
+        timelines.fan_out_post(instance, instance._followers)
+
+
+def post_feed_scopes(post, followers=None):
+    """Области кеша всех лент и страниц, на которых виден пост."""
+    scopes = [
+        'index',
+        f'post:{post.pk}',
+        f'profile:{post.author.username}',
+        f'author:{post.author_id}',
+        *follower_scopes(post.author_id, followers),
+    ]
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    scopes = post_feed_scopes(
+        instance, instance.__dict__.pop('_followers', None)
+    )
+    # Те же области нужны pregenerate_thumbnails: не считаем их дважды.
+    instance._feed_scopes = list(scopes)
+    previous = getattr(instance, '_previous_group', None)
+    if previous:
+        scopes.append(f'group:{previous[1]}')
+    bump_feed_versions(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    """Создаёт миниатюры картинки поста в фоне после коммита.
+
+    Пока миниатюр нет, ленты показывают оригинал, поэтому после
+    создания миниатюр кеш лент с постом сбрасывается.
+    """
+    if not instance.image:
+        return
+    image = instance.image
+    scopes = getattr(instance, '_feed_scopes', None)
+    if scopes is None:
+        scopes = post_feed_scopes(instance)
+    transaction.on_commit(lambda: thumbnails.pregenerate(
+        image, lambda: bump_feed_versions(*scopes)
+    ))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_post_comments(instance.post_id, -1)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    bump_feed_versions(f'post:{instance.post_id}')
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._previous_slug = (
+        Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    # Название и адрес группы выводятся во всех лентах.
+    scopes = ['index', 'groups', f'group:{instance.slug}']
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug:
+        scopes.append(f'group:{previous_slug}')
+    bump_feed_versions(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timelines.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    timelines.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follow_feeds(sender, instance, **kwargs):
+    bump_feed_versions(f'follow:{instance.user_id}')
@@ -0,0 +1,42 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своего содержимого, поэтому одинаковые
+загрузки сохраняются один раз и получают общие миниатюры
+sorl-thumbnail. Сколько постов ссылается на файл, учитывает модель
+StoredFile, а файлы без ссылок удаляет команда collect_media.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def hashed_name(self, name, content):
+        """Имя вида posts/ab/cd/abcd...ef.jpg по хешу содержимого."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest[2:4],
+            digest + posixpath.splitext(name)[1].lower(),
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежая отметка времени защищает файл от сборщика мусора,
+            # пока пост со ссылкой на него ещё не сохранён.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
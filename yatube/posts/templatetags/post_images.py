@@ -0,0 +1,55 @@
+from django import template
+from sorl.thumbnail import default
+
+from ..thumbnails import IMAGE_FRAME, image_variants
+
+register = template.Library()
+
+# Ширина картинки на странице: во всю ширину экрана, но не больше кадра.
+DEFAULT_SIZES = f'(min-width: {IMAGE_FRAME[0]}px) {IMAGE_FRAME[0]}px, 100vw'
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+}
+
+
+@register.inclusion_tag('includes/post_image.html')
+def post_image(image, sizes=DEFAULT_SIZES, css='card-img my-2'):
+    """Картинка поста с вариантами разной ширины и формата.
+
+    Берутся только готовые миниатюры, недостающие ставятся в очередь.
+    Пока нет ни одной миниатюры запасного формата, выводится оригинал.
+    """
+    variants = list(image_variants())
+    thumbnails = default.backend.lookup_many(image, [
+        (geometry_string, options)
+        for _, _, geometry_string, options in variants
+    ])
+    srcsets = {}
+    for (fmt, width, _, _), thumbnail in zip(variants, thumbnails):
+        if thumbnail is not None:
+            srcsets.setdefault(fmt, []).append(
+                (f'{thumbnail.url} {width}w', thumbnail)
+            )
+    fallback = srcsets.pop(None, [])
+    context = {
+        'css': css,
+        'sizes': sizes,
+        'src': image.url,
+        'sources': [
+            {
+                'type': MIME_TYPES[fmt],
+                'srcset': ', '.join(item for item, _ in srcset),
+            }
+            for fmt, srcset in srcsets.items()
+        ] if fallback else [],
+    }
+    if fallback:
+        largest = fallback[-1][1]
+        context.update(
+            src=largest.url,
+            srcset=', '.join(item for item, _ in fallback),
+            width=largest.width,
+            height=largest.height,
+        )
+    return context
@@ -0,0 +1,164 @@
+import datetime
+from unittest import mock
+
+from core.db.dates import DateHierarchyQuerySet
+from core.paginators import EstimatedCountPaginator
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+DATES = (
+    datetime.datetime(2019, 12, 31, 23, 30),
+    datetime.datetime(2020, 1, 15, 12, 0),
+    datetime.datetime(2020, 3, 2, 8, 0),
+    datetime.datetime(2020, 3, 2, 9, 0),
+    datetime.datetime(2021, 6, 1, 0, 0),
+)
+
+
+class AdminPostsMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number, date in enumerate(DATES):
+            post = Post.objects.create(
+                text=f'Пост {number}', author=cls.admin, group=group
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(date, timezone.utc)
+            )
+
+
+class EstimatedCountPaginatorTests(AdminPostsMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_exact_below_threshold(self):
+        '''небольшая выборка считается точно'''
+        paginator = EstimatedCountPaginator(Post.objects.all(), 2)
+        self.assertEqual(paginator.count, len(DATES))
+        self.assertFalse(paginator.estimated)
+
+    def test_cached_above_threshold(self):
+        '''большая выборка берёт число из кеша'''
+        queryset = Post.objects.filter(text__startswith='Пост')
+        with mock.patch.object(EstimatedCountPaginator, 'threshold', 2):
+            paginator = EstimatedCountPaginator(queryset, 2)
+            self.assertEqual(paginator.count, len(DATES))
+            self.assertTrue(paginator.estimated)
+            Post.objects.create(text='Пост новый', author=self.admin)
+            paginator = EstimatedCountPaginator(queryset, 2)
+            self.assertEqual(paginator.count, len(DATES))
+
+
+class DateHierarchyQuerySetTests(AdminPostsMixin, TestCase):
+    def test_dates_match_queryset(self):
+        '''периоды совпадают с QuerySet.dates()'''
+        posts = DateHierarchyQuerySet.wrap(Post.objects.all())
+        for kind in ('year', 'month', 'day'):
+            for order in ('ASC', 'DESC'):
+                with self.subTest(kind=kind, order=order):
+                    self.assertEqual(
+                        posts.dates('pub_date', kind, order),
+                        list(Post.objects.dates('pub_date', kind, order)),
+                    )
+
+    @timezone.override('Europe/Moscow')
+    def test_dates_in_current_timezone(self):
+        '''периоды совпадают с фильтрами ссылок в текущем часовом поясе'''
+        posts = DateHierarchyQuerySet.wrap(Post.objects.all())
+        months = posts.dates('pub_date', 'month')
+        self.assertEqual(
+            [(month.year, month.month) for month in months],
+            [(2020, 1), (2020, 3), (2021, 6)],
+        )
+        self.assertEqual(
+            sum(
+                Post.objects.filter(
+                    pub_date__year=month.year, pub_date__month=month.month
+                ).count()
+                for month in months
+            ),
+            len(DATES),
+        )
+
+    def test_dates_use_index(self):
+        '''годы ищутся по индексу, без DISTINCT по таблице'''
+        posts = DateHierarchyQuerySet.wrap(Post.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            years = posts.dates('pub_date', 'year')
+        self.assertEqual([year.year for year in years], [2019, 2020, 2021])
+        self.assertEqual(len(queries), 4)
+        for query in queries:
+            self.assertNotIn('DISTINCT', query['sql'])
+            self.assertIn('LIMIT 1', query['sql'])
+
+    def test_aggregate_edges(self):
+        '''Min и Max даты совпадают с обычным aggregate()'''
+        posts = DateHierarchyQuerySet.wrap(
+            Post.objects.filter(pub_date__year=2020)
+        )
+        expected = Post.objects.filter(pub_date__year=2020).aggregate(
+            first=Min('pub_date'), last=Max('pub_date')
+        )
+        self.assertEqual(
+            posts.aggregate(first=Min('pub_date'), last=Max('pub_date')),
+            expected,
+        )
+        self.assertEqual(
+            posts.none().aggregate(first=Min('pub_date')), {'first': None}
+        )
+
+
+class PostAdminTests(AdminPostsMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries(self):
+        '''список постов не считает таблицу целиком и не сортирует даты'''
+        url = reverse('admin:posts_post_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, len(DATES))
+        for query in queries:
+            self.assertNotIn('django_date_trunc', query['sql'])
+            # Полный COUNT(*) по таблице постов или групп
+            self.assertNotIn('AS "__count" FROM "', query['sql'])
+        self.assertContains(response, '?pub_date__year=2021')
+        self.assertNotContains(response, '≈')
+
+    def test_date_hierarchy_months(self):
+        '''внутри года показываются только месяцы с постами'''
+        response = self.client.get(
+            reverse('admin:posts_post_changelist') + '?pub_date__year=2020'
+        )
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertContains(response, 'pub_date__month=1')
+        self.assertContains(response, 'pub_date__month=3')
+        self.assertNotContains(response, 'pub_date__month=2')
+
+    def test_estimated_count_is_marked(self):
+        '''приблизительное число постов помечено знаком ≈'''
+        with mock.patch.object(EstimatedCountPaginator, 'threshold', 2):
+            response = self.client.get(
+                reverse('admin:posts_post_changelist')
+            )
+        self.assertTrue(response.context['cl'].paginator.estimated)
+        self.assertContains(response, '≈')
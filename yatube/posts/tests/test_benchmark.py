@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F, Max, Sum
+from django.test import TestCase
+
+from .. import benchmark, urls
+from ..fake_data import FakeDataGenerator
+from ..models import Comment, Follow, Post, TimelineEntry, UserStats
+
+
+class FakeDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        FakeDataGenerator(seed=7).generate(
+            users=40, groups=3, posts=600, comments=900, follows=150,
+        )
+
+    def test_counts(self):
+        '''генератор создаёт заданное число строк'''
+        self.assertEqual(UserStats.objects.count(), 40)
+        self.assertEqual(Post.objects.count(), 600)
+        self.assertEqual(Comment.objects.count(), 900)
+        self.assertEqual(Follow.objects.count(), 150)
+        self.assertFalse(
+            Follow.objects.filter(user_id=F('author_id')).exists()
+        )
+
+    def test_power_law(self):
+        '''у самого активного автора постов намного больше среднего'''
+        top = UserStats.objects.aggregate(top=Max('posts_count'))['top']
+        self.assertGreater(top, 600 / 40 * 3)
+
+    def test_counters_and_timelines(self):
+        '''счётчики и ленты подписок построены по данным'''
+        self.assertEqual(
+            UserStats.objects.aggregate(total=Sum('posts_count'))['total'],
+            600,
+        )
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list(
+                'author_id', flat=True
+            )
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+
+    def test_dates_spread(self):
+        '''даты постов растут вместе с id и распределены по времени'''
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True
+        ))
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreater((dates[-1] - dates[0]).days, 300)
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        FakeDataGenerator(seed=3).generate(
+            users=20, groups=2, posts=100, comments=100, follows=40,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_all_routes(self):
+        '''замеряется каждый маршрут, пишущие запросы откатываются'''
+        comments = Comment.objects.count()
+        follows = Follow.objects.count()
+        report = benchmark.run(requests=2, warmup=1, memory_samples=1)
+        self.assertEqual(
+            set(report['scenarios']),
+            {pattern.name for pattern in urls.urlpatterns},
+        )
+        for name, result in report['scenarios'].items():
+            with self.subTest(route=name):
+                self.assertIn(result['status'], (200, 302))
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertIsNotNone(result['peak_memory_kib'])
+        self.assertEqual(Comment.objects.count(), comments)
+        self.assertEqual(Follow.objects.count(), follows)
+        self.assertEqual(report['database']['post'], 100)
+        json.dumps(report)
+
+    def test_command_output(self):
+        '''команда сохраняет отчёт JSON и сравнивает его с прошлым'''
+        report = self.report_file()
+        call_command(
+            'benchmark', 'index', requests=1, warmup=0, memory_samples=0,
+            output=report, stdout=StringIO(),
+        )
+        out = StringIO()
+        call_command(
+            'benchmark', 'index', requests=1, warmup=0, memory_samples=0,
+            compare=report, stdout=out,
+        )
+        with open(report) as file:
+            self.assertEqual(list(json.load(file)['scenarios']), ['index'])
+        self.assertIn('p50_ms', out.getvalue())
+
+    def report_file(self):
+        file = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        file.close()
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_percentile(self):
+        '''перцентиль - ближайший ранг'''
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 50)
+        self.assertEqual(benchmark.percentile(values, 0.95), 95)
+        self.assertEqual(benchmark.percentile([7], 0.95), 7)
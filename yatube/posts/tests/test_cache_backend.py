@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from unittest import mock
+
+from core.cache import SQLiteCache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import SimpleTestCase
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_basic_operations(self):
+        '''кеш поддерживает операции BaseCache'''
+        cache = self.cache
+        cache.set('key', {'value': [1, 2]})
+        self.assertEqual(cache.get('key'), {'value': [1, 2]})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 1))
+        self.assertEqual(cache.incr('new', 5), 6)
+        self.assertEqual(
+            cache.get_many(['key', 'new', 'missing']),
+            {'key': {'value': [1, 2]}, 'new': 6},
+        )
+        cache.delete_many(['key', 'new'])
+        self.assertIsNone(cache.get('key'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.set('forever', 1, None)
+        self.assertTrue(cache.has_key('forever'))
+        cache.clear()
+        self.assertFalse(cache.has_key('forever'))
+
+    def test_expiration(self):
+        '''просроченные записи не возвращаются и освобождают add'''
+        cache = self.cache
+        cache.set('key', 'value', 1)
+        cache.set('gone', 'value', 0)
+        self.assertIsNone(cache.get('gone'))
+        with mock.patch('time.time', return_value=time.time() + 2):
+            self.assertIsNone(cache.get('key'))
+            self.assertTrue(cache.add('key', 'new'))
+            self.assertEqual(cache.get('key'), 'new')
+        self.assertTrue(cache.touch('key', None))
+        with mock.patch('time.time', return_value=time.time() + 2):
+            self.assertEqual(cache.get('key'), 'new')
+
+    def test_shared_between_processes(self):
+        '''запись из другого процесса видна сразу'''
+        self.cache.get('warm')
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.cache.set('from_child', os.getpid())
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(self.cache.get('from_child'), pid)
+        self.assertEqual(self.make_cache().get('from_child'), pid)
+
+    @mock.patch('core.cache.LRU_RESOLUTION', 0)
+    def test_lru_eviction(self):
+        '''при переполнении вытесняются давно не читанные записи'''
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(
+            cache.get_many(['a', 'b', 'c', 'd']),
+            {'a': 'a', 'c': 'c', 'd': 'd'},
+        )
+
+    def test_pluggable_serializer(self):
+        '''сериализатор задаётся опцией SERIALIZER'''
+        cache = self.make_cache(SERIALIZER='core.cache.JSONSerializer')
+        cache.set('key', {'a': [1, 'б']})
+        self.assertEqual(cache.get('key'), {'a': [1, 'б']})
+        raw, = cache._db.execute('SELECT value FROM cache').fetchone()
+        self.assertEqual(raw, '{"a":[1,"\\u0431"]}'.encode())
+
+    def test_non_ascii_keys(self):
+        '''ключи с кириллицей и пробелами не вызывают CacheKeyWarning'''
+        key = 'object:posts.group:slug:Тестовый слаг' + 'я' * 250
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.cache.set(key, 1)
+            self.assertEqual(self.cache.get(key), 1)
+
+    def test_tests_use_own_cache(self):
+        '''тесты не пишут в кеш сервера разработки'''
+        for alias in settings.CACHES:
+            with self.subTest(alias=alias):
+                self.assertFalse(
+                    caches[alias].path.startswith(settings.CACHE_DIR)
+                )
+        self.assertFalse(settings.METRICS_DIR.startswith(settings.CACHE_DIR))
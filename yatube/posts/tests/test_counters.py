@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(obj, field), value)
+
+    def test_post_counters(self):
+        '''посты учитываются у автора и группы'''
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        self.assertCounters(self.user.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=1)
+        post.delete()
+        self.assertCounters(self.user.stats, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=0)
+
+    def test_comment_counters(self):
+        '''комментарии учитываются у поста'''
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        self.assertCounters(post, comments_count=1)
+        comment.delete()
+        self.assertCounters(post, comments_count=0)
+
+    def test_follow_counters(self):
+        '''подписки учитываются у автора и подписчика'''
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertCounters(self.user.stats, followers_count=1)
+        self.assertCounters(self.reader.stats, following_count=1)
+        follow.delete()
+        self.assertCounters(self.user.stats, followers_count=0)
+        self.assertCounters(self.reader.stats, following_count=0)
+
+    def test_repair_counters(self):
+        '''команда восстанавливает испорченные счётчики'''
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.user)
+        UserStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7)
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=7)
+        call_command('repair_counters', stdout=mock.Mock())
+        self.assertCounters(
+            self.user.stats,
+            posts_count=1, followers_count=1, following_count=0)
+        self.assertCounters(self.reader.stats, following_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        self.assertCounters(self.other_group, posts_count=0)
+        self.assertCounters(post, comments_count=1)
+
+    def test_pages_show_counters_without_count_queries(self):
+        '''профиль и пост показывают счётчик без COUNT(*)'''
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        pages = {
+            reverse('posts:profile', args=(self.user,)): 'Всего постов: 1',
+            reverse('posts:post_detail', args=(post.pk,)):
+            'Всего постов автора: 1',
+        }
+        for url, text in pages.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = Client().get(url)
+                self.assertContains(response, text)
+                self.assertFalse(
+                    any('COUNT(' in query['sql'] for query in queries))
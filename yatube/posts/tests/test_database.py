@@ -0,0 +1,107 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+
+from core.db.sqlite3.base import PRAGMAS
+from core.management.commands.sqlite_load import Command as LoadCommand
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase
+
+ALIAS = 'profile_test'
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+
+    def connect(self, **options):
+        connections.databases[ALIAS] = {
+            'ENGINE': 'core.db.sqlite3',
+            'NAME': self.path,
+            'OPTIONS': options,
+        }
+        self.addCleanup(connections.databases.pop, ALIAS)
+        connection = connections[ALIAS]
+        self.addCleanup(connections.__delitem__, ALIAS)
+        self.addCleanup(connection.close)
+        return connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        '''новое соединение получает WAL и остальные PRAGMA'''
+        connection = self.connect()
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        for name in ('busy_timeout', 'mmap_size', 'cache_size'):
+            with self.subTest(pragma=name):
+                self.assertEqual(
+                    self.pragma(connection, name), PRAGMAS[name]
+                )
+
+    def test_pragmas_option(self):
+        '''опция pragmas переопределяет значения по умолчанию'''
+        connection = self.connect(pragmas={'mmap_size': 0})
+        self.assertEqual(self.pragma(connection, 'mmap_size'), 0)
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+
+    def test_atomic_takes_write_lock(self):
+        '''atomic() сразу берёт блокировку записи (BEGIN IMMEDIATE)'''
+        connection = self.connect()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with transaction.atomic(using=ALIAS):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM item')
+            with self.assertRaises(sqlite3.OperationalError):
+                other.execute('BEGIN IMMEDIATE')
+            # Читать базу при этом можно.
+            self.assertEqual(
+                other.execute('SELECT COUNT(*) FROM item').fetchone(), (0,)
+            )
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+
+    def test_invalid_transaction_mode(self):
+        '''неизвестный transaction_mode - ошибка конфигурации'''
+        self.connect(transaction_mode='LAZY')
+        with self.assertRaises(ImproperlyConfigured):
+            with transaction.atomic(using=ALIAS):
+                pass
+
+
+class SQLiteLoadTests(SimpleTestCase):
+    def test_concurrent_writes_not_locked(self):
+        '''конкурентная запись в production без «database is locked»'''
+        # Пропускная способность профилей сравнивается командой
+        # sqlite_load: в тестах она зависит от загрузки машины.
+        options = {'threads': 4, 'seconds': 0.3, 'write_ratio': 1}
+        with tempfile.TemporaryDirectory() as directory:
+            stats = LoadCommand().run_profile(
+                'production', os.path.join(directory, 'production.sqlite3'),
+                options,
+            )
+        self.assertEqual(stats['errors'], 0)
+        self.assertGreater(stats['requests'], 0)
+
+    def test_command_report(self):
+        '''команда печатает результат каждого профиля'''
+        out = StringIO()
+        call_command(
+            'sqlite_load', seconds=0.2, threads=2, profile=['production'],
+            stdout=out,
+        )
+        self.assertIn('production:', out.getvalue())
+        self.assertNotIn('baseline:', out.getvalue())
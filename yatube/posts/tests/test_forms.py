@@ -3,6 +3,7 @@ import tempfile
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
@@ -14,7 +15,7 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostFormsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -59,6 +60,9 @@ class PostFormsTests(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        caches['objects'].clear()
+
     def test_create_post(self):
         '''при отправке валидной формы со страницы
         создания поста создаётся новая запись в базе данных
@@ -125,3 +129,22 @@ class PostFormsTests(TestCase):
         self.assertEqual(last_comment.text, comment_data['text'])
         self.assertEqual(last_comment.post, self.post)
         self.assertEqual(last_comment.author, self.user)
+
+    def test_edit_keeps_comments_count(self):
+        '''правка поста не затирает число комментариев из кеша'''
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        self.authorized_client.get(detail)
+        for number in range(2):
+            self.authorized_client.post(
+                reverse('posts:add_comment', args=(self.post.pk,)),
+                data={'text': f'Комментарий {number}'},
+            )
+        response = self.authorized_client.get(detail)
+        self.assertEqual(response.context['post'].comments_count, 3)
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=(self.post.pk,)),
+            data={'text': 'Правка', 'group': self.group.pk},
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Правка')
+        self.assertEqual(post.comments_count, 3)
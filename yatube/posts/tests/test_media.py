@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = bytes(range(256)) * 4
+URL = '/media/posts/file.bin'
+DIGEST = 'ab' * 32
+HASHED_NAME = f'posts/ab/ab/{DIGEST}.bin'
+HASHED_URL = f'/media/{HASHED_NAME}'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'posts/file.bin'), 'wb') as f:
+            f.write(CONTENT)
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts/ab/ab'))
+        with open(os.path.join(TEMP_MEDIA_ROOT, HASHED_NAME), 'wb') as f:
+            f.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_full_file(self):
+        '''файл отдаётся целиком с ETag, Last-Modified и Accept-Ranges'''
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_cache_control(self):
+        '''надолго кешируются только файлы с хешем содержимого в имени'''
+        legacy = self.client.get(URL)['Cache-Control'].split(', ')
+        self.assertIn(
+            f'max-age={settings.MEDIA_MUTABLE_MAX_AGE}', legacy)
+        self.assertIn('must-revalidate', legacy)
+        self.assertNotIn('immutable', legacy)
+        hashed = self.client.get(HASHED_URL)['Cache-Control'].split(', ')
+        self.assertIn(f'max-age={settings.MEDIA_CACHE_MAX_AGE}', hashed)
+        self.assertIn('immutable', hashed)
+
+    def test_conditional_get(self):
+        '''совпавший ETag или дата дают 304 без тела'''
+        response = self.client.get(URL)
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ):
+            with self.subTest(headers=headers):
+                cached = self.client.get(URL, **headers)
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_ranges(self):
+        '''запрос Range получает 206 и нужный кусок файла'''
+        for header, start, end in (
+            ('bytes=10-19', 10, 19),
+            ('bytes=1000-', 1000, 1023),
+            ('bytes=-4', 1020, 1023),
+            ('bytes=1020-5000', 1020, 1023),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(URL, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    b''.join(response.streaming_content),
+                    CONTENT[start:end + 1],
+                )
+                self.assertEqual(
+                    response['Content-Range'],
+                    f'bytes {start}-{end}/{len(CONTENT)}',
+                )
+                self.assertEqual(
+                    response['Content-Length'], str(end - start + 1))
+
+    def test_unsatisfiable_range(self):
+        '''диапазон за концом файла даёт 416'''
+        response = self.client.get(URL, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+        self.assertNotIn('Cache-Control', response)
+
+    def test_hashed_name_etag(self):
+        '''ETag файла с хешем в имени не зависит от времени изменения'''
+        response = self.client.get(HASHED_URL)
+        self.assertEqual(response['ETag'], f'"{DIGEST}"')
+        os.utime(os.path.join(TEMP_MEDIA_ROOT, HASHED_NAME))
+        cached = self.client.get(
+            HASHED_URL, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(cached.status_code, 304)
+        self.assertIn('max-age', cached['Cache-Control'])
+
+    def test_if_range(self):
+        '''устаревший If-Range отменяет диапазон'''
+        etag = self.client.get(URL)['ETag']
+        response = self.client.get(
+            URL, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        for stale in ('"0-0"', http_date(0)):
+            with self.subTest(if_range=stale):
+                response = self.client.get(
+                    URL, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=stale)
+                self.assertEqual(response.status_code, 200)
+
+    def test_missing_and_outside_files(self):
+        '''несуществующие файлы и пути за MEDIA_ROOT дают 404'''
+        for url in ('/media/posts/none.bin', '/media/posts',
+                    '/media/../manage.py'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        '''с nginx файл передаётся через X-Accel-Redirect'''
+        response = self.client.get(URL)
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/file.bin')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        '''с Apache файл передаётся через X-Sendfile'''
+        response = self.client.get(URL)
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(TEMP_MEDIA_ROOT, 'posts/file.bin'),
+        )
@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+
+from core.cache import SQLiteCache
+from core.metrics import CACHE_REQUESTS, Registry, key_prefix, registry
+
+from django.core.cache.utils import make_template_fragment_key
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+
+class MetricsDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class RegistryTests(MetricsDirMixin, SimpleTestCase):
+    def test_key_prefix(self):
+        '''префикс ключа кеша не содержит идентификаторов'''
+        cases = {
+            'feed:index_page:anonymous:1:2': 'feed:index_page',
+            'feed_version:group:slug': 'feed_version:group',
+            'object:posts.post:pk:5': 'object:posts.post',
+            'sorl-thumbnail||image||abc': 'sorl-thumbnail',
+            'page42': 'page',
+            '42': 'other',
+        }
+        for key, prefix in cases.items():
+            with self.subTest(key=key):
+                self.assertEqual(key_prefix(key), prefix)
+
+    def test_template_fragment_key_prefix(self):
+        '''префикс ключа фрагмента шаблона обрывается на имени фрагмента'''
+        for fragment in ('index_page', 'follow_page'):
+            for vary_on in ([], [1], ['anonymous', 2], ['e'], ['abc']):
+                key = make_template_fragment_key(fragment, vary_on)
+                with self.subTest(key=key):
+                    self.assertEqual(
+                        key_prefix(key), f'template.cache.{fragment}')
+
+    def test_render(self):
+        '''счётчики и гистограммы выводятся в формате Prometheus'''
+        metrics = Registry()
+        hits = metrics.counter('hits_total', 'Попадания', ('page',))
+        latency = metrics.histogram(
+            'latency_seconds', 'Время', buckets=(0.1, 1)
+        )
+        hits.inc(page='index')
+        hits.inc(2, page='index')
+        latency.observe(0.5)
+        self.assertEqual(metrics.render(), '\n'.join((
+            '# HELP hits_total Попадания',
+            '# TYPE hits_total counter',
+            'hits_total{page="index"} 3',
+            '# HELP latency_seconds Время',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 0',
+            'latency_seconds_bucket{le="1"} 1',
+            'latency_seconds_bucket{le="+Inf"} 1',
+            'latency_seconds_sum 0.5',
+            'latency_seconds_count 1',
+        )) + '\n')
+        with self.assertRaises(ValueError):
+            hits.inc(view='index')
+
+    def test_processes_are_summed(self):
+        '''эндпоинт складывает снимки всех процессов'''
+        workers = [Registry(), Registry()]
+        for number, worker in enumerate(workers, 1):
+            worker.counter('hits_total', 'Попадания').inc(number)
+        workers[0].flush(force=True)
+        self.assertIn('hits_total 3\n', workers[1].render())
+        # Без сохранения снимка соседний процесс видит старые значения.
+        workers[0].metrics['hits_total'].inc(10)
+        self.assertIn('hits_total 3\n', workers[1].render())
+        workers[0].flush(force=True)
+        self.assertIn('hits_total 13\n', workers[1].render())
+
+    def test_cache_reads_by_prefix(self):
+        '''кеш считает попадания и промахи по префиксу ключа'''
+        cache = SQLiteCache(os.path.join(self.directory, 'pages.sqlite3'), {})
+
+        def count(result):
+            labels = (
+                ('cache', 'pages'), ('prefix', 'feed:index_page'),
+                ('result', result),
+            )
+            return registry.snapshot().get((CACHE_REQUESTS.name, labels), 0)
+
+        before = count('hit'), count('miss')
+        cache.get('feed:index_page:anonymous:1')
+        cache.set('feed:index_page:anonymous:1', 'page')
+        cache.get_many(['feed:index_page:anonymous:1'])
+        self.assertEqual(
+            (count('hit'), count('miss')), (before[0] + 1, before[1] + 1)
+        )
+
+
+class MetricsViewTests(MetricsDirMixin, TestCase):
+    def test_endpoint(self):
+        '''эндпоинт отдаёт время ответов по имени маршрута'''
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        content = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",method="GET",le="+Inf"}',
+            content,
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', content)
+        self.assertIn('# TYPE yatube_upload_size_bytes histogram', content)
+        self.assertTrue(os.listdir(self.directory))
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_endpoint_is_internal(self):
+        '''с чужого адреса эндпоинта не видно'''
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
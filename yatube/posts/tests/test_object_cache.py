@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.http import Http404
+from django.test import TestCase
+
+from ..models import Comment, Group, Post
+from ..object_cache import get_cached_object, get_cached_object_or_404
+
+User = get_user_model()
+
+
+class ObjectCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        caches['objects'].clear()
+
+    def test_lookups_served_from_cache(self):
+        '''повторный поиск по pk, slug и username не обращается к БД'''
+        lookups = (
+            (Post, {'pk': self.post.pk}, self.post),
+            (Group, {'slug': self.group.slug}, self.group),
+            (User, {'username': self.user.username}, self.user),
+        )
+        for model, lookup, expected in lookups:
+            with self.subTest(model=model.__name__):
+                get_cached_object(model, **lookup)
+                with self.assertNumQueries(0):
+                    self.assertEqual(
+                        get_cached_object(model, **lookup), expected)
+
+    def test_save_invalidates(self):
+        '''сохранение объекта сбрасывает кеш'''
+        get_cached_object(Group, slug=self.group.slug)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new_slug'
+        group.save()
+        self.assertEqual(
+            get_cached_object(Group, slug='new_slug').pk, group.pk)
+        with self.assertRaises(Http404):
+            get_cached_object_or_404(Group, slug='test_slug')
+
+    def test_delete_invalidates(self):
+        '''удалённый объект не отдаётся из кеша'''
+        post = Post.objects.create(author=self.user, text='Удаляемый пост')
+        get_cached_object(Post, pk=post.pk)
+        post_id = post.pk
+        post.delete()
+        with self.assertRaises(Http404):
+            get_cached_object_or_404(Post, pk=post_id)
+
+    def test_counters_invalidate(self):
+        '''счётчики, изменённые через UPDATE, не отстают в кеше'''
+        get_cached_object(Group, slug=self.group.slug)
+        get_cached_object(Post, pk=self.post.pk)
+        Post.objects.create(
+            author=self.user, text='Пост в группе', group=self.group
+        )
+        Comment.objects.create(
+            author=self.user, post=self.post, text='Комментарий'
+        )
+        self.assertEqual(
+            get_cached_object(Group, slug=self.group.slug).posts_count, 1
+        )
+        self.assertEqual(
+            get_cached_object(Post, pk=self.post.pk).comments_count, 1
+        )
+
+    def test_user_cached_without_password(self):
+        '''в кеш объектов на диске не попадает хеш пароля пользователя'''
+        self.user.set_password('secret')
+        self.user.save()
+        cached = get_cached_object(User, username=self.user.username)
+        self.assertEqual(cached.username, self.user.username)
+        rows = caches['objects']._db.execute('SELECT value FROM cache')
+        for value, in rows:
+            self.assertNotIn(self.user.password.encode(), value)
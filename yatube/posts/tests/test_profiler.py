@@ -0,0 +1,158 @@
+import json
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from core import profiler
+from core.middleware import SamplingProfilerMiddleware
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import ResolverMatch, reverse
+
+User = get_user_model()
+
+
+def slow_view(request):
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return HttpResponse()
+
+
+class ProfilerTestMixin:
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(PROFILER_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(profiler.get_config, refresh=True)
+        self.addCleanup(cache.delete, profiler.CONFIG_KEY)
+
+
+class SamplingProfilerTests(ProfilerTestMixin, TestCase):
+    def call(self, view_name):
+        def get_response(request):
+            request.resolver_match = ResolverMatch(
+                slow_view, (), {}, url_name=view_name
+            )
+            middleware.process_view(request, slow_view, (), {})
+            return slow_view(request)
+        middleware = SamplingProfilerMiddleware(get_response)
+        middleware(RequestFactory().get('/'))
+
+    def test_collapse(self):
+        '''стек записывается от корня до текущей функции'''
+        root = sys._getframe()
+
+        def inner():
+            return profiler.collapse(sys._getframe(), root)
+
+        self.assertEqual(inner(), f'{__name__}:inner')
+        stacks = Counter({'a;b;c': 2, 'a;c': 1, 'a': 4})
+        self.assertEqual(
+            profiler.leaves(stacks), Counter({'c': 3, 'a': 4})
+        )
+        self.assertEqual(profiler.render(stacks), 'a 4\na;b;c 2\na;c 1\n')
+
+    def test_profiles_selected_views(self):
+        '''профилируются только выбранные маршруты'''
+        config = profiler.set_config(
+            rate=100, views=['slow'], interval_ms=1, reset=True
+        )
+        self.call('slow')
+        self.call('other')
+        stacks = profiler.store.collect(config['generation'])
+        self.assertTrue(stacks)
+        self.assertTrue(all(stack.startswith('slow;') for stack in stacks))
+        self.assertTrue(any(
+            stack.endswith(f'{__name__}:slow_view') for stack in stacks
+        ))
+
+    def test_disabled(self):
+        '''с нулевой долей запросы не профилируются'''
+        config = profiler.set_config(
+            rate=0, views=[], interval_ms=1, reset=True
+        )
+        self.call('slow')
+        self.assertFalse(profiler.store.collect(config['generation']))
+
+    def test_reset(self):
+        '''сброс начинает новое поколение стеков'''
+        config = profiler.set_config(
+            rate=100, views=[], interval_ms=1, reset=True
+        )
+        self.call('slow')
+        self.assertTrue(profiler.store.collect(config['generation']))
+        config = profiler.set_config(
+            rate=100, views=[], interval_ms=1, reset=True
+        )
+        self.assertFalse(profiler.store.collect(config['generation']))
+
+
+    def test_flush_throttled(self):
+        '''стеки пишутся в файл не чаще PROFILER_FLUSH_INTERVAL'''
+        store = profiler.SampleStore()
+        store.add('slow', Counter({'a': 1}), 0)
+        self.assertFalse(store._files())
+        with override_settings(PROFILER_FLUSH_INTERVAL=60):
+            store.flush(force=True)
+            self.assertEqual(len(store._files()), 1)
+            store.add('slow', Counter({'a': 1}), 0)
+            store.flush()
+        with open(store._files()[0]) as file:
+            self.assertEqual(json.load(file)['stacks'], {'slow;a': 1})
+        store.flush(force=True)
+        with open(store._files()[0]) as file:
+            self.assertEqual(json.load(file)['stacks'], {'slow;a': 2})
+
+
+class ProfilerViewTests(ProfilerTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def test_admin_only(self):
+        '''страницы профилировщика доступны только персоналу'''
+        self.client.force_login(self.user)
+        for name in ('profiler', 'profiler_stacks'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 302)
+                self.assertIn(reverse('admin:login'), response.url)
+
+    def test_configure_and_download(self):
+        '''настройка сохраняется, стеки скачиваются файлом'''
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('profiler'), {
+            'rate': 100, 'views': 'posts:index', 'interval_ms': 1,
+        })
+        self.assertRedirects(response, reverse('profiler'))
+        config = profiler.get_config()
+        self.assertEqual(config['views'], ['posts:index'])
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('profiler'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('profiler_stacks'))
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="stacks.txt"',
+        )
+        for line in response.content.decode().splitlines():
+            self.assertRegex(line, r'^posts:index(;\S+)* \d+$')
+
+    def test_invalid_view_name(self):
+        '''неверное имя маршрута не сохраняется'''
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('profiler'), {
+            'rate': 10, 'views': 'posts:index, /posts/', 'interval_ms': 5,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
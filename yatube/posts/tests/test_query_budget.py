@@ -0,0 +1,86 @@
+from core.middleware import QueryBudgetMiddleware
+from core.queries import (Budget, QueryBudgetExceeded, QueryStats,
+                          query_budget, untracked)
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..models import Group
+
+User = get_user_model()
+
+
+def list_groups(request):
+    # Запрос на каждую группу и повтор одного и того же запроса.
+    for group in Group.objects.all():
+        Group.objects.get(pk=group.pk)
+    Group.objects.get(pk=group.pk)
+    return HttpResponse()
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description='Описание',
+            )
+
+    def call(self, view, user=None):
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = QueryBudgetMiddleware(get_response)
+        request = RequestFactory().get('/')
+        request.user = user
+        middleware(request)
+        return request.query_stats
+
+    def test_stats(self):
+        '''считаются запросы и повторы одинаковых запросов'''
+        stats = QueryStats()
+        with stats.track():
+            Group.objects.get(slug='group-0')
+            Group.objects.get(slug='group-0')
+            Group.objects.count()
+            with untracked():
+                Group.objects.count()
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.duplicates, 1)
+        self.assertGreater(stats.time_ms, 0)
+
+    def test_overruns(self):
+        '''превышение времени - не строгая ошибка'''
+        stats = QueryStats()
+        stats.count, stats.seconds = 5, 1.0
+        problems = Budget(queries=3, time_ms=10).overruns(stats)
+        self.assertEqual([hard for hard, _ in problems], [True, False])
+        self.assertEqual(Budget(queries=5).overruns(stats), [])
+
+    def test_view_without_budget(self):
+        '''без бюджета запросы только считаются'''
+        stats = self.call(list_groups)
+        self.assertEqual(stats.count, 5)
+        self.assertEqual(stats.duplicates, 1)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_budget(self):
+        '''в строгом режиме превышение бюджета - ошибка'''
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'запросов 5 > 2'):
+            self.call(query_budget(queries=2, duplicates=1)(list_groups))
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'повторов 1 > 0'):
+            self.call(query_budget(queries=5)(list_groups))
+        self.call(query_budget(queries=5, duplicates=1)(list_groups))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_warning(self):
+        '''вне тестов превышение бюджета пишется в лог'''
+        # Бюджет виден и через декораторы, обёрнутые functools.wraps.
+        view = login_required(query_budget(queries=10)(list_groups))
+        user = User.objects.create_user(username='reader')
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            self.call(view, user)
+        self.assertIn('повторов 1 > 0', logs.output[0])
@@ -0,0 +1,144 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import timelines
+from ..models import Comment, Follow, Group, Post
+from ..views import COMMENT_COUNT, POST_COUNT
+
+User = get_user_model()
+
+
+def explain(sql, params=()):
+    """Возвращает шаги плана запроса SQLite."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTests(TestCase):
+    """Запросы лент из view должны идти по индексам, без сортировки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for author in (cls.author, cls.celebrity):
+            for number in range(POST_COUNT + 2):
+                Post.objects.create(
+                    author=author, group=cls.group, text=f'Пост {number}'
+                )
+        cls.post = Post.objects.filter(author=cls.author).first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Ответ {number}')
+            for number in range(COMMENT_COUNT + 2)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.celebrity)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def page_plans(self, url, table, per_page, param='cursor'):
+        """Планы запросов страницы ленты: первой и следующей по курсору.
+
+        Запросы берутся из ответа view, а не собираются в тесте.
+        """
+        plans = []
+        while len(plans) < 2:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            sql, = (
+                query['sql'] for query in queries
+                if f'FROM "{table}"' in query['sql']
+                and f'LIMIT {per_page + 1}' in query['sql']
+            )
+            plans.append(explain(sql))
+            page = response.context[
+                'comments' if table == 'posts_comment' else 'page_obj'
+            ]
+            url = f'{url.split("?")[0]}?{param}={page.next_cursor}'
+        self.assertTrue(page.has_previous())
+        return plans
+
+    def test_feed_queries_use_indexes(self):
+        '''ленты и комментарии читаются по индексам на любой странице'''
+        feeds = {
+            'index': (
+                reverse('posts:index'), 'posts_post', POST_COUNT,
+                'post_pub_date_idx',
+            ),
+            'group_list': (
+                reverse('posts:group_list', args=[self.group.slug]),
+                'posts_post', POST_COUNT, 'post_group_pub_date_idx',
+            ),
+            'profile': (
+                reverse('posts:profile', args=[self.author.username]),
+                'posts_post', POST_COUNT, 'post_author_pub_date_idx',
+            ),
+            'comments': (
+                reverse('posts:post_detail', args=[self.post.pk]),
+                'posts_comment', COMMENT_COUNT,
+                'comment_post_pub_date_idx',
+            ),
+        }
+        for name, (url, table, per_page, index) in feeds.items():
+            param = 'comments' if table == 'posts_comment' else 'cursor'
+            plans = self.page_plans(url, table, per_page, param)
+            for page, plan in enumerate(plans):
+                with self.subTest(name=name, page=page):
+                    plan = ' | '.join(plan)
+                    self.assertIn(f'INDEX {index}', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+            # Страница по курсору начинается с поиска по дате в индексе.
+            self.assertIn('pub_date<?', ' | '.join(plans[1]))
+
+    @mock.patch('posts.timelines.CELEBRITY_FOLLOWERS', 1)
+    @mock.patch('posts.timelines.FORMER_CELEBRITY_FOLLOWERS', 1)
+    def test_follow_feed_reads_sources_by_index(self):
+        '''лента подписок читает каждый источник по индексу'''
+        timelines.update_celebrities()
+        plans = self.page_plans(
+            reverse('posts:follow_index'), 'posts_post', POST_COUNT
+        )
+        for page, plan in enumerate(plans):
+            with self.subTest(page=page):
+                self.assertFalse(
+                    [step for step in plan if step.startswith('SCAN')]
+                )
+                plan = ' | '.join(plan)
+                self.assertIn(
+                    'COVERING INDEX timeline_user_pub_date_idx', plan
+                )
+                self.assertIn(
+                    'COVERING INDEX post_author_pub_date_idx', plan
+                )
+                # Посты страницы читаются по pk из подзапросов; сортируются
+                # только они, не больше страницы на источник.
+                self.assertIn(
+                    'SEARCH posts_post USING INTEGER PRIMARY KEY', plan
+                )
+                self.assertEqual(plan.count('TEMP B-TREE'), 1)
+        self.assertIn('(user_id=? AND pub_date<?)', ' | '.join(plans[1]))
+
+    def test_fan_out_uses_index(self):
+        '''подписчики автора для fan-out ищутся по индексу'''
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        with CaptureQueriesContext(connection) as queries:
+            timelines.fan_out_post(post)
+        sql, = (
+            query['sql'] for query in queries
+            if 'FROM "posts_follow"' in query['sql']
+        )
+        self.assertIn('INDEX follow_author_user_idx', ' | '.join(explain(sql)))
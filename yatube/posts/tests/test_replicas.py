@@ -0,0 +1,131 @@
+from core.db.routers import (ReplicaRouter, has_written, pin_primary,
+                             routing_scope)
+from core.middleware import PIN_COOKIE
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_replica(self):
+        '''чтение идёт в реплику, запись - в основную базу'''
+        with routing_scope():
+            self.assertEqual(self.router.db_for_read(Post), REPLICA)
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_read_your_writes(self):
+        '''после записи чтение до конца запроса идёт в основную базу'''
+        with routing_scope():
+            self.router.db_for_write(Post)
+            self.assertTrue(has_written())
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        with routing_scope():
+            self.assertEqual(self.router.db_for_read(Post), REPLICA)
+
+    def test_pinned(self):
+        '''закреплённое чтение идёт в основную базу'''
+        with routing_scope(pinned=True):
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        with routing_scope():
+            with pin_primary():
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), REPLICA)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        '''без реплик всё читается из основной базы'''
+        with routing_scope():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_no_migrations_on_replica(self):
+        '''миграции на реплики не применяются'''
+        self.assertIs(self.router.allow_migrate(REPLICA, 'posts'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_MAX_LAG=0)
+class ReplicaRoutingViewsTests(TransactionTestCase):
+    '''Реплика - второе соединение к той же тестовой базе.'''
+
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = {
+            **connections['default'].settings_dict,
+            'TEST': {'MIRROR': 'default'},
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.user, text='Текст')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_feed_reads_from_replica(self):
+        '''лента читается из реплики'''
+        self.client.logout()
+        primary, replica = self.get(reverse('posts:index'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_sticky_after_write(self):
+        '''после записи пользователь читает из основной базы'''
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        with override_settings(REPLICA_MAX_LAG=5):
+            primary, replica = self.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            )
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    def test_recently_changed_feed_from_primary(self):
+        '''страницу недавно изменённой ленты строит основная база'''
+        self.client.logout()
+        with override_settings(REPLICA_MAX_LAG=60):
+            primary, replica = self.get(reverse('posts:index'))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    def test_atomic_reads_from_primary(self):
+        '''внутри транзакции чтение идёт в основную базу'''
+        with transaction.atomic(), routing_scope():
+            self.assertEqual(Post.objects.get().pk, self.post.pk)
+            self.assertEqual(
+                ReplicaRouter().db_for_read(Post), 'default'
+            )
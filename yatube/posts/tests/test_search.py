@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import search_posts
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.group = Group.objects.create(
+            title='Кошки',
+            slug='cats',
+            description='Тестовое описание',
+        )
+        cls.cat_post = Post.objects.create(
+            author=cls.user,
+            text='Кот спит на подоконнике, кот любит солнце',
+        )
+        cls.dog_post = Post.objects.create(
+            author=cls.user,
+            text='Собака гуляет во дворе <script>',
+            group=cls.group,
+        )
+
+    def test_search_by_text_and_group_title(self):
+        '''посты находятся по тексту и по названию группы'''
+        self.assertEqual(list(search_posts('собака')), [self.dog_post])
+        self.assertEqual(list(search_posts('кошки')), [self.dog_post])
+        self.assertEqual(list(search_posts('под')), [self.cat_post])
+        self.assertEqual(list(search_posts('!!!')), [])
+
+    def test_index_follows_changes(self):
+        '''индекс обновляется при правке и удалении постов и групп'''
+        Post.objects.filter(pk=self.cat_post.pk).update(text='Попугай')
+        self.assertEqual(list(search_posts('попугай')), [self.cat_post])
+        self.assertEqual(list(search_posts('кот')), [])
+        Group.objects.filter(pk=self.group.pk).update(title='Псы')
+        self.assertEqual(list(search_posts('псы')), [self.dog_post])
+        Post.objects.get(pk=self.dog_post.pk).delete()
+        self.assertEqual(list(search_posts('собака')), [])
+
+    def test_ranking(self):
+        '''чем больше совпадений, тем выше пост'''
+        post = Post.objects.create(author=self.user, text='Кот один раз')
+        self.assertEqual(list(search_posts('кот')), [self.cat_post, post])
+
+    def test_search_page_highlights_matches(self):
+        '''страница поиска выделяет совпадения и экранирует текст'''
+        response = self.client.get(reverse('posts:search'), {'q': 'собака'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertContains(response, '<mark>Собака</mark>')
+        self.assertContains(response, '&lt;script&gt;')
+        self.assertNotContains(response, '<script>', html=False)
+
+    def test_admin_search_uses_index(self):
+        '''поиск в админке идёт по полнотекстовому индексу'''
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dog_post])
@@ -0,0 +1,98 @@
+import os
+import re
+import shutil
+import tempfile
+
+from core.cache import SQLiteCache
+from core.timing import current_timer, phase, request_timer, timed
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+
+User = get_user_model()
+
+METRIC_RE = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?')
+
+
+class PhaseTests(SimpleTestCase):
+    def test_nested_phase_counted_once(self):
+        '''вложенная фаза того же имени не удваивает время'''
+        @timed('cache')
+        def inner():
+            with phase('cache'):
+                pass
+
+        with request_timer() as timer:
+            inner()
+            with phase('template'):
+                inner()
+        self.assertEqual(timer.calls['cache'], 2)
+        self.assertEqual(timer.calls['template'], 1)
+        self.assertIsNone(current_timer())
+
+    def test_phase_without_timer(self):
+        '''вне запроса фазы ничего не учитывают'''
+        with phase('sql'):
+            self.assertIsNone(current_timer())
+
+    def test_cache_hits_and_misses(self):
+        '''кеш считает попадания и промахи таймера запроса'''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        cache = SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {})
+        with request_timer() as timer:
+            cache.set('key', 1)
+            cache.get_many(['key', 'missing'])
+            cache.get('key')
+        self.assertEqual(timer.events['cache_hits'], 2)
+        self.assertEqual(timer.events['cache_misses'], 1)
+        self.assertEqual(timer.calls['cache'], 3)
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def metrics(self, response):
+        return {
+            name: (float(duration), desc)
+            for name, duration, desc in METRIC_RE.findall(
+                response['Server-Timing']
+            )
+        }
+
+    def test_header(self):
+        '''ответ содержит время всех фаз запроса'''
+        response = self.client.get(
+            reverse('posts:profile', args=[self.user.username])
+        )
+        metrics = self.metrics(response)
+        self.assertEqual(
+            set(metrics), {'sql', 'template', 'thumbnail', 'cache', 'total'}
+        )
+        self.assertRegex(metrics['sql'][1], r'^\d+ queries$')
+        self.assertRegex(metrics['cache'][1], r'^\d+ hits \d+ misses$')
+        self.assertGreater(metrics['template'][0], 0)
+        self.assertGreaterEqual(metrics['total'][0], metrics['template'][0])
+
+    def test_log_line(self):
+        '''запрос пишет строку лога с разбивкой времени'''
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        line, = logs.output
+        self.assertIn('view=posts:index method=GET status=200', line)
+        for field in ('sql_ms', 'template_ms', 'thumbnail_ms', 'cache_ms',
+                      'total_ms', 'queries', 'cache_hits', 'cache_misses'):
+            self.assertIn(f' {field}=', line)
+        self.assertEqual(logs.records[0].timing['view'], 'posts:index')
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_disabled(self):
+        '''заголовок выключается настройкой'''
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from core import slow_queries
+from core.log import RotatingFileHandler
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(SLOW_QUERY_MS=0)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.create(text='Тестовый пост', author=cls.admin,
+                            group=group)
+
+    def entries(self, url):
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_view_query(self):
+        '''медленный запрос view пишется с параметрами, стеком и планом'''
+        entries = self.entries(
+            reverse('posts:profile', args=[self.admin.username])
+        )
+        entry = next(
+            entry for entry in entries
+            if 'FROM "posts_post"' in entry['sql']
+        )
+        self.assertEqual(entry['view'], 'posts:profile')
+        self.assertEqual(entry['database'], 'default')
+        self.assertIn(str(self.admin.pk), entry['params'])
+        self.assertTrue(entry['plan'])
+        self.assertTrue(all(isinstance(step, str) for step in entry['plan']))
+        self.assertTrue(any(
+            frame.startswith('posts/') for frame in entry['stack']
+        ))
+        self.assertFalse(any(
+            frame.startswith(('core/middleware.py', 'core/slow_queries.py'))
+            for frame in entry['stack']
+        ))
+
+    def test_admin_changelist(self):
+        '''запросы списка постов в админке тоже попадают в журнал'''
+        self.client.force_login(self.admin)
+        entries = self.entries(
+            reverse('admin:posts_post_changelist') + '?pub_date__year=2020'
+        )
+        views = {entry['view'] for entry in entries}
+        self.assertEqual(views, {'admin:posts_post_changelist'})
+        self.assertTrue(any(
+            'pub_date' in entry['sql'] and entry['plan'] for entry in entries
+        ))
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        '''без порога журнал не пишется'''
+        with mock.patch.object(slow_queries.logger, 'warning') as warning:
+            self.client.get(reverse('posts:index'))
+        warning.assert_not_called()
+
+
+class RotatingFileHandlerTests(SimpleTestCase):
+    def test_creates_directory(self):
+        '''файл журнала создаётся вместе с каталогом'''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'logs', 'slow.log')
+        handler = RotatingFileHandler(path, maxBytes=1024, delay=True)
+        self.addCleanup(handler.close)
+        handler.emit(logging.makeLogRecord({'msg': 'запрос'}))
+        with open(path, encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'запрос\n')
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Post, StoredFile
+from ..thumbnails import THUMBNAILS, pregenerate
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+def upload(name, content=SMALL_GIF):
+    return SimpleUploadedFile(name, content, 'image/gif')
+
+
+def thumbnail_files():
+    return [
+        name
+        for _, _, names in os.walk(os.path.join(TEMP_MEDIA_ROOT, 'cache'))
+        for name in names
+    ]
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, image):
+        return Post.objects.create(author=self.user, text='Мем', image=image)
+
+    def references(self, name):
+        return StoredFile.objects.get(name=name).references
+
+    def collect(self):
+        call_command('collect_media', min_age=0, stdout=StringIO())
+
+    def test_identical_uploads_share_file(self):
+        '''одинаковые загрузки хранятся одним файлом с общим счётчиком'''
+        first = self.create_post(upload('meme.gif'))
+        second = self.create_post(upload('copy.GIF'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w\w/\w\w/\w{64}\.gif$')
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.name)],
+        )
+        self.assertEqual(self.references(first.image.name), 2)
+
+    def test_references_follow_posts(self):
+        '''счётчик меняется при замене картинки и удалении поста'''
+        post = self.create_post(upload('meme.gif'))
+        old_name = post.image.name
+        post.image = upload('other.gif', OTHER_GIF)
+        post.save()
+        self.assertEqual(self.references(old_name), 0)
+        self.assertEqual(self.references(post.image.name), 1)
+        post.delete()
+        self.assertEqual(self.references(post.image.name), 0)
+
+    def test_collect_removes_orphans(self):
+        '''сборщик удаляет файлы без ссылок вместе с миниатюрами'''
+        kept = self.create_post(upload('meme.gif'))
+        removed = self.create_post(upload('other.gif', OTHER_GIF))
+        pregenerate(removed.image)
+        self.assertEqual(len(thumbnail_files()), len(THUMBNAILS))
+        storage = removed.image.storage
+        orphan = storage.save('posts/orphan.gif', ContentFile(b'orphan'))
+        removed.delete()
+        self.collect()
+        self.assertTrue(storage.exists(kept.image.name))
+        self.assertFalse(storage.exists(removed.image.name))
+        self.assertFalse(storage.exists(orphan))
+        self.assertFalse(
+            StoredFile.objects.filter(name=removed.image.name).exists()
+        )
+        self.assertEqual(thumbnail_files(), [])
+
+    def test_collect_keeps_recent_files(self):
+        '''недавно освободившиеся файлы сборщик не трогает'''
+        post = self.create_post(upload('meme.gif'))
+        name = post.image.name
+        post.delete()
+        call_command('collect_media', stdout=StringIO())
+        self.assertTrue(post.image.storage.exists(name))
+
+    def test_repair_counters(self):
+        '''repair_counters восстанавливает счётчики ссылок на файлы'''
+        post = self.create_post(upload('meme.gif'))
+        StoredFile.objects.all().delete()
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(self.references(post.image.name), 1)
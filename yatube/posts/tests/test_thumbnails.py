@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+
+from ..models import Post
+from ..templatetags.post_images import post_image
+from ..thumbnails import IMAGE_WIDTHS, THUMBNAILS, pregenerate
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def cached_thumbnails(self):
+        return [
+            default.backend.cached_thumbnail(
+                self.post.image, geometry_string, **options
+            )
+            for geometry_string, options in THUMBNAILS
+        ]
+
+    def test_request_does_not_resize(self):
+        '''при промахе шаблон выводит оригинал, миниатюры ставятся в очередь'''
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{self.post.image.url}"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertNotContains(response, 'srcset=')
+        self.assertNotIn(None, self.cached_thumbnails())
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.post.image.url)
+        for thumbnail in self.cached_thumbnails():
+            self.assertContains(response, thumbnail.url)
+        for width in IMAGE_WIDTHS:
+            self.assertContains(response, f' {width}w')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_variants_read_in_one_query(self):
+        '''все варианты картинки читаются из key-value store разом'''
+        pregenerate(self.post.image)
+        cache.clear()
+        with mock.patch.object(KVStore, '_get_raw') as get_raw:
+            with CaptureQueriesContext(connection) as queries:
+                context = post_image(self.post.image)
+        get_raw.assert_not_called()
+        self.assertEqual(len(queries), 1)
+        self.assertIn(' 960w', context['srcset'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(post_image(self.post.image), context)
+        self.assertEqual(len(queries), 0)
+
+    def test_thumbnail_extension(self):
+        '''имя миниатюры получает расширение и для форматов вне sorl'''
+        backend = default.backend
+        source = ImageFile(self.post.image)
+        for fmt, extension in (('JPEG', '.jpg'), ('AVIF', '.avif')):
+            name = backend._get_thumbnail_filename(
+                source, '320x113', {'format': fmt}
+            )
+            self.assertTrue(name.endswith(extension))
+
+    def test_pregenerate(self):
+        '''pregenerate создаёт все миниатюры и вызывает callback один раз'''
+        calls = []
+        pregenerate(self.post.image, lambda: calls.append(1))
+        pregenerate(self.post.image, lambda: calls.append(1))
+        self.assertNotIn(None, self.cached_thumbnails())
+        self.assertEqual(calls, [1])
+
+    def test_backfill_command(self):
+        '''команда generate_thumbnails создаёт миниатюры старых постов'''
+        self.assertEqual(set(self.cached_thumbnails()), {None})
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.assertNotIn(None, self.cached_thumbnails())
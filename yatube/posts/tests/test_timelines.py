@@ -0,0 +1,160 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+from ..timelines import TimelinePaginator, is_celebrity, update_celebrities
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def follow_feed(self):
+        return list(
+            self.reader_client.get(
+                reverse('posts:follow_index')
+            ).context['page_obj']
+        )
+
+    def test_follow_fills_timeline(self):
+        '''подписка добавляет в ленту уже опубликованные посты'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertIn(self.old_post, self.follow_feed())
+
+    def test_new_post_fans_out(self):
+        '''новый пост раскладывается в ленты подписчиков'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.follow_feed()[0], post)
+
+    def test_unfollow_clears_timeline(self):
+        '''отписка убирает посты автора из ленты'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=(self.author,)))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [])
+
+    @mock.patch('posts.timelines.CELEBRITY_FOLLOWERS', 1)
+    @mock.patch('posts.timelines.FORMER_CELEBRITY_FOLLOWERS', 1)
+    def test_celebrity_posts_read_on_demand(self):
+        '''посты знаменитостей не раскладываются, а читаются из ленты'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(update_celebrities(), ([self.author.pk], []))
+        TimelineEntry.objects.all().delete()
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [post, self.old_post])
+
+    @mock.patch('posts.timelines.CELEBRITY_FOLLOWERS', 3)
+    @mock.patch('posts.timelines.FORMER_CELEBRITY_FOLLOWERS', 2)
+    def test_former_celebrity_posts_backfilled(self):
+        '''посты, написанные в статусе знаменитости, остаются в ленте'''
+        others = [
+            User.objects.create_user(username=f'other{number}')
+            for number in range(2)
+        ]
+        for user in (self.reader, *others):
+            Follow.objects.create(user=user, author=self.author)
+        update_celebrities()
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=post).exists())
+        # Отписка сама по себе ленты не дополняет.
+        client = Client()
+        client.force_login(others[0])
+        with CaptureQueriesContext(connection) as queries:
+            client.get(
+                reverse('posts:profile_unfollow', args=(self.author,)))
+        self.assertFalse(Follow.objects.filter(user=others[0]).exists())
+        self.assertFalse(any(
+            'INSERT INTO "posts_timelineentry"' in query['sql']
+            for query in queries
+        ))
+        # Между порогами статус не меняется.
+        self.assertEqual(update_celebrities(), ([], []))
+        Follow.objects.filter(user=others[1]).delete()
+        self.assertEqual(update_celebrities(), ([], [self.author.pk]))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.follow_feed(), [post, self.old_post])
+
+    @mock.patch('posts.timelines.CELEBRITY_FOLLOWERS', 1)
+    @mock.patch('posts.timelines.FORMER_CELEBRITY_FOLLOWERS', 1)
+    def test_update_celebrities_command(self):
+        '''команда отмечает знаменитостей'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        out = StringIO()
+        call_command('update_celebrities', stdout=out)
+        self.assertIn('Новых знаменитостей: 1', out.getvalue())
+        self.assertTrue(is_celebrity(self.author.pk))
+
+    def test_cursor_walks_merged_sources(self):
+        '''курсор проходит ленту и посты знаменитостей без повторов'''
+        celebrity = User.objects.create_user(username='celebrity')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=celebrity)
+        posts = [self.old_post]
+        for number in range(4):
+            posts.append(Post.objects.create(
+                author=(self.author, celebrity)[number % 2],
+                text=f'Пост {number}',
+            ))
+        posts.reverse()
+        # Автор стал знаменитостью: его посты есть и в ленте.
+        paginator = TimelinePaginator(
+            self.reader, [self.author.pk, celebrity.pk], 2
+        )
+        pages = [paginator.get_page(None)]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([post for page in pages for post in page], posts)
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[-2]))
+
+    def test_follow_feed_queries_do_not_grow(self):
+        '''число запросов ленты подписок не зависит от числа постов'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        with CaptureQueriesContext(connection) as few:
+            self.follow_feed()
+        for number in range(5):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.follow_feed()
+        self.assertEqual(len(few), len(many))
+
+    def test_rebuild_timelines(self):
+        '''команда пересобирает ленты по подпискам'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=mock.Mock())
+        self.assertIn(self.old_post, self.follow_feed())
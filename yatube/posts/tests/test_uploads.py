@@ -0,0 +1,156 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+from ..uploads import LimitedUploadHandler, normalize_image
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+ORIENTATION = 0x0112
+CAMERA_MAKE = 0x010F
+
+
+def make_jpeg(size=(40, 20), orientation=None):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[CAMERA_MAKE] = 'Телефон'
+    if orientation:
+        exif[ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpeg', buffer.getvalue(), 'image/jpeg')
+
+
+def make_gif(frames=1):
+    images = [Image.new('P', (10, 10), color) for color in range(frames)]
+    buffer = BytesIO()
+    images[0].save(
+        buffer, 'GIF', save_all=True, append_images=images[1:],
+        comment=b'GPS: 55.75, 37.62',
+    )
+    return SimpleUploadedFile('anim.gif', buffer.getvalue(), 'image/gif')
+
+
+def open_image(file):
+    file.seek(0)
+    return Image.open(BytesIO(file.read()))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class UploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_exif_rotation_and_metadata(self):
+        '''картинка поворачивается по EXIF и теряет метаданные'''
+        image = open_image(normalize_image(make_jpeg(orientation=6)))
+        self.assertEqual(image.size, (20, 40))
+        self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(IMAGE_MAX_SIDE=10)
+    def test_dimensions_capped(self):
+        '''длинная сторона уменьшается до IMAGE_MAX_SIDE'''
+        normalized = normalize_image(make_jpeg())
+        self.assertEqual(open_image(normalized).size, (10, 5))
+        self.assertEqual(normalized.name, 'photo.jpg')
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_decompression_bomb_rejected(self):
+        '''картинка со слишком большим разрешением отклоняется'''
+        with self.assertRaises(ValidationError):
+            normalize_image(make_jpeg())
+
+    def test_upload_through_form(self):
+        '''загруженная через форму картинка сохраняется очищенной'''
+        response = self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с фото', 'image': make_jpeg(orientation=6)},
+        )
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(text='Пост с фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with post.image.open() as file:
+            image = Image.open(file)
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_large_upload_rejected(self):
+        '''слишком большой файл не сохраняется, форма сообщает об ошибке'''
+        response = self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Большое фото', 'image': make_jpeg()},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.context['form'].has_error('image', code='file_size')
+        )
+        self.assertFalse(Post.objects.filter(text='Большое фото').exists())
+
+    def test_gif_comment_stripped(self):
+        '''комментарий GIF не переживает пересохранение'''
+        normalized = normalize_image(make_gif())
+        self.assertNotIn(b'GPS', normalized.read())
+        self.assertNotIn('comment', open_image(normalized).info)
+
+    def test_animation_rejected(self):
+        '''анимированная картинка отклоняется с ошибкой формы'''
+        response = self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Анимация', 'image': make_gif(frames=2)},
+        )
+        self.assertTrue(
+            response.context['form'].has_error('image', code='animated')
+        )
+        self.assertFalse(Post.objects.filter(text='Анимация').exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_handler_stops_upload(self):
+        '''разбор запроса обрывается сразу после превышения размера'''
+        request = RequestFactory().post('/')
+        handler = LimitedUploadHandler(request)
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', None)
+        handler.receive_data_chunk(b'x' * 100, 0)
+        with self.assertRaises(StopUpload) as stop:
+            handler.receive_data_chunk(b'x', 100)
+        self.assertTrue(stop.exception.connection_reset)
+        self.assertEqual(request.upload_too_large, 'image')
+        handler.file.close()
+
+    def test_replace_image_through_form(self):
+        '''замена картинки при правке укладывается в бюджет запросов'''
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с фото', 'image': make_jpeg()},
+        )
+        post = Post.objects.get(text='Пост с фото')
+        response = self.client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': 'Новое фото', 'image': make_jpeg(size=(30, 30))},
+        )
+        self.assertEqual(response.status_code, 302)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новое фото')
+        with post.image.open() as file:
+            self.assertEqual(Image.open(file).size, (30, 30))
@@ -1,16 +1,21 @@
 import shutil
 import tempfile
+import time
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.middleware.csrf import _get_new_csrf_token
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from ..models import Comment, Follow, Group, Post
-from ..views import POST_COUNT
+from ..views import COMMENT_COUNT, POST_COUNT
 
 User = get_user_model()
 
@@ -19,7 +24,7 @@ REMAINING_POSTS = 3
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -217,7 +222,8 @@ class PostViewsTests(TestCase):
         response = self.client.get(
             reverse('posts:index')
         )
-        new_post.delete()
+        # update() не вызывает сигналов и не сбрасывает кеш
+        Post.objects.filter(pk=new_post.pk).update(text='Без сигналов')
         response_2 = self.client.get(
             reverse('posts:index')
         )
@@ -228,6 +234,55 @@ class PostViewsTests(TestCase):
         )
         self.assertNotEqual(response.content, response_3.content)
 
+    def test_cache_invalidated_by_signals(self):
+        '''изменения постов, комментариев и групп сбрасывают ленты'''
+        pages = {
+            'index': reverse('posts:index'),
+            'group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': self.user}),
+        }
+        for name, url in pages.items():
+            with self.subTest(name=name):
+                self.client.get(url)
+                new_post = Post.objects.create(
+                    group=self.group,
+                    author=self.user,
+                    text=f'Пост {name}',
+                )
+                self.assertContains(self.client.get(url), new_post.text)
+                new_post.delete()
+                self.assertNotContains(self.client.get(url), new_post.text)
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(detail)
+        comment = Comment.objects.create(
+            text='Свежий комментарий',
+            post=self.post,
+            author=self.user_2,
+        )
+        self.assertContains(self.client.get(detail), comment.text)
+        self.group.title = 'Переименованная группа'
+        self.group.save()
+        self.assertContains(self.client.get(detail), self.group.title)
+
+    def test_cache_keys_on_page(self):
+        """страницы ленты кешируются под разными ключами"""
+        self.client.get(reverse('posts:index'))
+        text = 'Текст после кеширования'
+        Post.objects.filter(pk=self.post.pk).update(text=text)
+        cached = self.client.get(reverse('posts:index'))
+        other_page = self.client.get(reverse('posts:index') + '?page=1')
+        self.assertNotContains(cached, text)
+        self.assertContains(other_page, text)
+
+    def test_cache_keys_on_audience(self):
+        """анонимная копия ленты не отдаётся авторизованному пользователю"""
+        self.client.get(reverse('posts:index'))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, reverse('posts:follow_index'))
+
     def test_follow(self):
         '''Авторизованный пользователь может подписываться
         на других пользователей и удалять их из подписок'''
@@ -304,6 +359,9 @@ class PaginatorViewsTest(TestCase):
             'profile': f'/profile/{cls.user}/'
         }
 
+    def setUp(self):
+        cache.clear()
+
     def test_paginator_correct_context(self):
         """index, group_list, profile содержат 10 постов на первой странице"""
         for name, url in self.paginator_context_names.items():
@@ -319,3 +377,217 @@ class PaginatorViewsTest(TestCase):
                 response = self.client.get(url + '?page=2')
                 self.assertEqual(len(response.context['page_obj']),
                                  REMAINING_POSTS)
+
+    def test_cursor_paginator_walks_feed(self):
+        """Курсор ведёт на следующую страницу и обратно без пропусков"""
+        for name, url in self.paginator_context_names.items():
+            with self.subTest(name=name):
+                first = self.client.get(url).context['page_obj']
+                self.assertEqual(len(first), FULL_NUMBER_OF_POSTS)
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    f'{url}?cursor={first.next_cursor}'
+                ).context['page_obj']
+                self.assertEqual(len(second), REMAINING_POSTS)
+                self.assertFalse(second.has_next())
+                self.assertTrue(
+                    set(first).isdisjoint(second)
+                )
+                back = self.client.get(
+                    f'{url}?cursor={second.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_cursor_page_has_no_numbers(self):
+        """Методы страницы, основанные на номерах, не падают"""
+        page = self.client.get('/').context['page_obj']
+        self.assertTrue(page.has_other_pages())
+        self.assertEqual(len(page), FULL_NUMBER_OF_POSTS)
+        for name in (
+            'next_page_number', 'previous_page_number',
+            'start_index', 'end_index',
+        ):
+            self.assertIsNone(getattr(page, name)(), name)
+        self.assertIsNone(page.number)
+        self.assertIsNone(page.paginator.count)
+        self.assertIsNone(page.paginator.num_pages)
+        self.assertEqual(list(page.paginator.page_range), [])
+
+    def test_cursor_paginator_skips_count(self):
+        """Страница по курсору не выполняет COUNT(*)"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.paginator_context_names['group_list'])
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.client.get('/?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']),
+                         FULL_NUMBER_OF_POSTS)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.comments_count = COMMENT_COUNT + REMAINING_POSTS
+        for number in range(cls.comments_count):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'user_{number}'),
+                text=f'Комментарий {number}',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста первая порция комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENT_COUNT)
+        self.assertTrue(comments.has_next())
+        self.assertContains(
+            response, reverse('posts:post_comments', args=(self.post.pk,)))
+
+    def test_load_more_returns_next_slice(self):
+        """Эндпоинт отдаёт только следующую порцию комментариев"""
+        first = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'cursor': first.next_cursor},
+        )
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), REMAINING_POSTS)
+        self.assertTrue(set(first).isdisjoint(rest))
+
+    def test_comment_authors_loaded_in_one_query(self):
+        """Авторы комментариев не запрашиваются по одному"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:post_comments', args=(self.post.pk,)))
+        self.assertEqual(len(queries), 1)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+            reverse('posts:post_detail', args=(cls.post.pk,)),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, client, url, response):
+        return client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+
+    def test_not_modified_without_page_query(self):
+        """Запрос с валидаторами получает 304 без запросов к постам"""
+        for client in (self.client, self.reader_client):
+            for url in self.urls:
+                with self.subTest(url=url, client=client):
+                    response = client.get(url)
+                    self.assertIn('Last-Modified', response)
+                    with CaptureQueriesContext(connection) as queries:
+                        cached = self.revalidate(client, url, response)
+                    self.assertEqual(cached.status_code, 304)
+                    self.assertEqual(cached['ETag'], response['ETag'])
+                    self.assertFalse(any(
+                        'posts_' in query['sql']
+                        for query in queries.captured_queries
+                    ))
+
+    def test_changes_reset_validators(self):
+        """Новый пост, комментарий и правка меняют ETag своих страниц"""
+        detail_url = reverse('posts:post_detail', args=(self.post.pk,))
+        changes = (
+            (lambda: Post.objects.create(
+                author=self.author, text='Новый пост', group=self.group),
+             self.urls),
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+             (detail_url,)),
+            (lambda: self.post.save(), self.urls),
+        )
+        for change, urls in changes:
+            responses = [self.client.get(url) for url in self.urls]
+            change()
+            for url, response in zip(self.urls, responses):
+                with self.subTest(url=url):
+                    fresh = self.revalidate(self.client, url, response)
+                    self.assertEqual(
+                        fresh.status_code, 200 if url in urls else 304)
+
+    def test_validators_depend_on_user(self):
+        """ETag зависит от посетителя и его подписок"""
+        url = reverse('posts:profile', args=(self.author.username,))
+        anonymous = self.client.get(url)
+        response = self.reader_client.get(url)
+        self.assertNotEqual(anonymous['ETag'], response['ETag'])
+        Follow.objects.create(user=self.reader, author=self.author)
+        fresh = self.revalidate(self.reader_client, url, response)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertTrue(fresh.context['following'])
+
+    def test_validators_depend_on_csrf_token(self):
+        """Новый CSRF-токен меняет ETag страницы с формой"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        response = self.reader_client.get(url)
+        self.assertEqual(
+            self.revalidate(self.reader_client, url, response).status_code,
+            304,
+        )
+        self.reader_client.cookies[settings.CSRF_COOKIE_NAME] = (
+            _get_new_csrf_token()
+        )
+        fresh = self.revalidate(self.reader_client, url, response)
+        self.assertEqual(fresh.status_code, 200)
+
+    def test_last_modified_within_second(self):
+        """Изменение в ту же секунду не даёт 304 по If-Modified-Since"""
+        url = reverse('posts:index')
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            response = self.client.get(url)
+            Post.objects.create(author=self.author, text='Ещё пост')
+            # Новую версию страницы кеширует другой посетитель.
+            Client().get(url)
+            fresh = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+        self.assertEqual(fresh.status_code, 200)
+        with mock.patch('time.time', return_value=now + 1):
+            response = self.client.get(url)
+            cached = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+        self.assertEqual(cached.status_code, 304)
@@ -0,0 +1,276 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Шаблоны не ресайзят картинки во время запроса: бэкенд
+PregeneratedThumbnailBackend только ищет готовую миниатюру в
+key-value store sorl-thumbnail, а при промахе ставит её создание в пул
+потоков и отдаёт оригинал. Миниатюры новых постов создаются после
+сохранения поста, уже загруженных картинок - командой
+generate_thumbnails. Поиск и создание миниатюр в потоке запроса -
+фаза thumbnail его таймера (core.timing).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+
+from core.metrics import registry
+from core.queries import untracked
+from core.timing import timed
+
+from django.conf import settings
+from django.db import connections
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger(__name__)
+
+# Ширины вариантов картинки для srcset; кадр везде 960x339.
+IMAGE_WIDTHS = (320, 480, 640, 960)
+IMAGE_FRAME = (960, 339)
+IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+# Современные форматы в порядке предпочтения, если их умеет Pillow.
+# Запасной вариант - формат по умолчанию THUMBNAIL_FORMAT.
+MODERN_FORMATS = ('AVIF', 'WEBP')
+DEFAULT_WORKERS = 2
+
+
+def image_formats():
+    """Форматы вариантов: поддерживаемые современные и запасной (None)."""
+    Image.init()
+    return (
+        *(fmt for fmt in MODERN_FORMATS if fmt in Image.SAVE),
+        None,
+    )
+
+
+def image_variants():
+    """Варианты картинки: (формат, ширина, геометрия, опции)."""
+    frame_width, frame_height = IMAGE_FRAME
+    for fmt in image_formats():
+        options = dict(IMAGE_OPTIONS)
+        if fmt is not None:
+            options['format'] = fmt
+        for width in IMAGE_WIDTHS:
+            height = round(width * frame_height / frame_width)
+            yield fmt, width, f'{width}x{height}', options
+
+
+# Миниатюры, которые выводят шаблоны: геометрия и опции.
+THUMBNAILS = tuple(
+    (geometry_string, options)
+    for _, _, geometry_string, options in image_variants()
+)
+
+THUMBNAIL_SECONDS = registry.histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время создания миниатюры по формату',
+    ('format',),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+_lock = threading.Lock()
+_executor = None
+_pending = {}
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который не создаёт миниатюры в запросе."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра или оригинал, пока миниатюра создаётся."""
+        thumbnail = self.lookup(file_, geometry_string, **options)
+        if thumbnail is not None:
+            return thumbnail
+        return ImageFile(file_)
+
+    @timed('thumbnail')
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None; при промахе она ставится в очередь."""
+        return self.lookup_many(file_, [(geometry_string, options)])[0]
+
+    @timed('thumbnail')
+    def lookup_many(self, file_, thumbnails):
+        """Готовые миниатюры для пар (геометрия, опции) списком.
+
+        Вместо миниатюры, которой ещё нет, - None, а её создание ставится
+        в очередь. Записи key-value store читаются разом: одним get_many
+        из кеша и одним запросом к базе для промахов кеша, а не запросом
+        на каждую миниатюру.
+        """
+        source = ImageFile(file_)
+        files = [
+            self._thumbnail_file(source, geometry_string, options)
+            for geometry_string, options in thumbnails
+        ]
+        found = self._stored(files)
+        for thumbnail, (geometry_string, options) in zip(found, thumbnails):
+            if thumbnail is None:
+                submit(
+                    (source.name, geometry_string, *sorted(options.items())),
+                    _generate, source, geometry_string, options,
+                )
+        return found
+
+    def cached_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из key-value store или None, если её ещё нет."""
+        return default.kvstore.get(
+            self._thumbnail_file(ImageFile(file_), geometry_string, options)
+        )
+
+    def _stored(self, files):
+        """Записи key-value store для файлов миниатюр или None."""
+        kvstore = default.kvstore
+        if not isinstance(kvstore, cached_db_kvstore.KVStore):
+            return [kvstore.get(file) for file in files]
+        keys = [add_prefix(file.key, 'image') for file in files]
+        values = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            # Отсутствие записи тоже кешируется, как в cached_db_kvstore.
+            fetched = {
+                key: found.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            }
+            kvstore.cache.set_many(
+                fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(fetched)
+        return [
+            None
+            if values[key] == cached_db_kvstore.EMPTY_VALUE
+            or not values[key]
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+    @timed('thumbnail')
+    def generate(self, file_, geometry_string, **options):
+        """Создаёт миниатюру, как это делает ThumbnailBackend."""
+        started = time.perf_counter()
+        thumbnail = super().get_thumbnail(file_, geometry_string, **options)
+        THUMBNAIL_SECONDS.observe(
+            time.perf_counter() - started,
+            format=options.get('format', sorl_settings.THUMBNAIL_FORMAT),
+        )
+        return thumbnail
+
+    def _thumbnail_file(self, source, geometry_string, options):
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self._with_defaults(source, options)
+        )
+        return ImageFile(name, default.storage)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        """Как в ThumbnailBackend, но с расширением для любого формата."""
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        extension = EXTENSIONS.get(
+            options['format'], options['format'].lower()
+        )
+        return f'{sorl_settings.THUMBNAIL_PREFIX}{path}.{extension}'
+
+    def _with_defaults(self, source, options):
+        """Опции с умолчаниями, которыми их дополняет ThumbnailBackend.
+
+        От опций зависит имя файла миниатюры, поэтому они должны
+        совпадать с теми, что получит generate.
+        """
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+
+def _generate(source, geometry_string, options):
+    """Создаёт миниатюру, если её нет; возвращает True, если создана."""
+    backend = default.backend
+    if backend.cached_thumbnail(source, geometry_string, **options):
+        return False
+    backend.generate(source, geometry_string, **options)
+    return True
+
+
+def _pregenerate(source, callback):
+    created = False
+    for geometry_string, options in THUMBNAILS:
+        created = _generate(source, geometry_string, options) or created
+    if created and callback is not None:
+        callback()
+
+
+def _run(key, func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', key)
+    finally:
+        connections.close_all()
+        with _lock:
+            _pending.pop(key, None)
+
+
+def _get_executor(workers):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def submit(key, func, *args):
+    """Ставит задачу в пул; задача с тем же key не дублируется.
+
+    При THUMBNAIL_WORKERS = 0 задача выполняется сразу в текущем
+    потоке - так удобнее в тестах и командах; её запросы не входят в
+    бюджет запросов view.
+    """
+    workers = getattr(settings, 'THUMBNAIL_WORKERS', DEFAULT_WORKERS)
+    if not workers:
+        with untracked():
+            func(*args)
+        return
+    with _lock:
+        if key not in _pending:
+            _pending[key] = _get_executor(workers).submit(
+                _run, key, func, *args
+            )
+
+
+def pregenerate(file_, callback=None):
+    """Ставит в очередь все миниатюры THUMBNAILS для картинки file_.
+
+    file_ - файл вместе с хранилищем (FieldFile или ImageFile): от
+    класса хранилища зависят ключи миниатюр. callback вызывается, если
+    была создана хотя бы одна миниатюра.
+    """
+    source = ImageFile(file_)
+    submit(('pregenerate', source.name), _pregenerate, source, callback)
+
+
+def wait():
+    """Ждёт, пока пул обработает все поставленные задачи."""
+    while True:
+        with _lock:
+            futures = list(_pending.values())
+        if not futures:
+            return
+        wait_futures(futures)
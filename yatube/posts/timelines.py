@@ -0,0 +1,206 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Новый пост сразу раскладывается в TimelineEntry каждого подписчика, и
+лента подписок читается по индексу (user, -pub_date, -post) без
+соединения через Follow. Посты авторов с большим числом подписчиков не
+раскладываются: они подмешиваются в ленту при чтении (fan-out on read).
+
+Статус знаменитости (UserStats.is_celebrity) меняет не запрос, а
+команда update_celebrities: когда автор перестаёт быть знаменитостью,
+все его посты раскладываются в ленты всех подписчиков задним числом.
+Порог понижения ниже порога повышения, поэтому подписка и отписка у
+границы не переключают статус туда и обратно.
+"""
+from core.paginators import FORWARD, CursorPaginator, seek
+
+from django.db import transaction
+from django.db.models import Q
+
+from .feed_cache import bump_feed_versions
+from .models import Follow, Post, TimelineEntry, UserStats
+
+# Начиная с этого числа подписчиков автор становится знаменитостью,
+CELEBRITY_FOLLOWERS = 1000
+# а перестаёт ею быть, когда подписчиков меньше этого числа.
+FORMER_CELEBRITY_FOLLOWERS = 900
+BATCH_SIZE = 500
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id, is_celebrity=True
+    ).exists()
+
+
+def celebrity_ids(user):
+    """Авторы-знаменитости, на которых подписан пользователь."""
+    return Follow.objects.filter(
+        user=user, author__stats__is_celebrity=True
+    ).values_list('author_id', flat=True)
+
+
+def fan_out_followers(author_id):
+    """Подписчики, в ленты которых расходятся посты автора, списком.
+
+    У знаменитости их нет: её посты читаются при показе ленты.
+    """
+    if is_celebrity(author_id):
+        return []
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def fan_out_post(post, followers=None):
+    """Добавляет новый пост в ленты подписчиков автора.
+
+    followers - уже прочитанный fan_out_followers автора.
+    """
+    if followers is None:
+        followers = fan_out_followers(post.author_id)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author(user_id, author_id):
+    """Заполняет ленту постами автора, на которого оформлена подписка."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def promote_celebrities():
+    """Отмечает знаменитостями авторов с CELEBRITY_FOLLOWERS подписчиков.
+
+    Возвращает id новых знаменитостей.
+    """
+    promoted = list(UserStats.objects.filter(
+        is_celebrity=False, followers_count__gte=CELEBRITY_FOLLOWERS
+    ).values_list('user_id', flat=True))
+    UserStats.objects.filter(user_id__in=promoted).update(is_celebrity=True)
+    return promoted
+
+
+def backfill_author(author_id):
+    """Раскладывает все посты автора в ленты всех его подписчиков.
+
+    Посты, написанные в статусе знаменитости, не раскладывались, а
+    без этого статуса лента их больше не подмешивает.
+    """
+    posts = list(Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date'))
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for user_id in followers.iterator()
+            for pk, pub_date in posts
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def demote_celebrities():
+    """Снимает статус с авторов, у которых меньше
+    FORMER_CELEBRITY_FOLLOWERS подписчиков, дополняя ленты их постами.
+
+    Возвращает id бывших знаменитостей.
+    """
+    demoted = list(UserStats.objects.filter(
+        is_celebrity=True, followers_count__lt=FORMER_CELEBRITY_FOLLOWERS
+    ).values_list('user_id', flat=True))
+    for author_id in demoted:
+        # Пока идёт раскладка, посты ещё подмешиваются при чтении, а
+        # повтор поста в обоих источниках лента отбрасывает.
+        with transaction.atomic():
+            backfill_author(author_id)
+            UserStats.objects.filter(user_id=author_id).update(
+                is_celebrity=False
+            )
+    return demoted
+
+
+def update_celebrities():
+    """Пересчитывает статус знаменитостей по числу подписчиков.
+
+    Ленты подписок подписчиков изменившихся авторов сбрасываются: от
+    статуса зависит, откуда лента берёт их посты. Возвращает пару
+    списков id: новые и бывшие знаменитости.
+    """
+    promoted = promote_celebrities()
+    demoted = demote_celebrities()
+    for author_id in (*promoted, *demoted):
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        bump_feed_versions(*(f'follow:{user_id}' for user_id in followers))
+    return promoted, demoted
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорная пагинация ленты подписок.
+
+    Источники ленты - записи TimelineEntry читателя и посты каждой
+    знаменитости - читаются подзапросами по своим индексам, каждый не
+    дальше одной страницы от курсора. Посты страницы выбираются одним
+    запросом по pk из этих подзапросов, так что стоимость страницы не
+    зависит ни от длины ленты, ни от числа постов знаменитостей.
+    """
+
+    def __init__(self, user, celebrities, per_page):
+        super().__init__(
+            Post.objects.select_related('author', 'group'), per_page
+        )
+        self.user = user
+        self.celebrities = list(celebrities)
+
+    def page_queryset(self, direction=FORWARD, position=None):
+        limit = self.per_page + 1
+        sources = [
+            seek(
+                TimelineEntry.objects.filter(user=self.user),
+                direction, position, pk='post_id',
+            ).values('post_id')[:limit],
+            *(
+                seek(
+                    Post.objects.filter(author_id=author_id),
+                    direction, position,
+                ).values('pk')[:limit]
+                for author_id in self.celebrities
+            ),
+        ]
+        # Пост может попасть и в ленту, и в посты знаменитости, если
+        # автор стал ею после подписки: OR не даёт ему повториться.
+        condition = Q()
+        for source in sources:
+            condition |= Q(pk__in=source)
+        return seek(
+            self.object_list.filter(condition), direction, None
+        )[:limit]
@@ -0,0 +1,150 @@
+"""Обработка загружаемых картинок постов.
+
+Загрузка пишется на диск по частям и обрывается, как только превышен
+IMAGE_UPLOAD_MAX_SIZE. Перед сохранением картинка проверяется по
+заголовку на «бомбу распаковки», поворачивается по EXIF, уменьшается
+до IMAGE_MAX_SIDE и пересохраняется без метаданных. Анимированные
+GIF, WebP и PNG не принимаются: сохраняется только один кадр.
+"""
+import os
+import warnings
+from io import BytesIO
+
+from core.metrics import registry
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler
+)
+from PIL import Image, ImageOps
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 40_000_000
+DEFAULT_MAX_SIDE = 2048
+JPEG_QUALITY = 85
+# Форматы, которые сохраняются как есть; остальные переводятся в JPEG.
+KEPT_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# Ключи Image.info, которые не метаданные и нужны при сохранении.
+KEPT_INFO = ('transparency',)
+
+UPLOAD_BYTES = registry.histogram(
+    'yatube_upload_size_bytes',
+    'Размер загруженных файлов, включая отброшенные байты',
+    buckets=tuple(
+        size * 1024 for size in (64, 256, 512, 1024, 2048, 5120, 10240)
+    ),
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и обрывает её по размеру.
+
+    Как только файл превышает IMAGE_UPLOAD_MAX_SIZE, разбор запроса
+    останавливается без чтения остатка тела, а имя поля запоминается
+    в request.upload_too_large для ошибки формы (add_upload_errors).
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        max_size = _setting('IMAGE_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+        if self.received > max_size:
+            UPLOAD_BYTES.observe(self.received)
+            self.request.upload_too_large = self.field_name
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        UPLOAD_BYTES.observe(self.received)
+        return super().file_complete(file_size)
+
+
+def _size_error():
+    max_size = _setting('IMAGE_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+    return ValidationError(
+        'Файл больше %(limit)d МБ.',
+        code='file_size',
+        params={'limit': max_size // (1024 * 1024)},
+    )
+
+
+def add_upload_errors(request, form):
+    """Добавляет в форму ошибку поля, загрузка которого оборвана."""
+    field = getattr(request, 'upload_too_large', None)
+    if field in form.fields:
+        form.add_error(field, _size_error())
+
+
+def _open(file):
+    """Открывает картинку, читая только заголовок."""
+    file.seek(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            image = Image.open(file)
+        except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+            raise ValidationError(
+                'Слишком большое разрешение картинки.', code='bomb'
+            )
+    width, height = image.size
+    if width * height > _setting('IMAGE_MAX_PIXELS', DEFAULT_MAX_PIXELS):
+        raise ValidationError(
+            'Слишком большое разрешение картинки.', code='bomb'
+        )
+    return image
+
+
+def check_size(file):
+    """Бросает ValidationError, если файл больше IMAGE_UPLOAD_MAX_SIZE."""
+    if file.size > _setting('IMAGE_UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE):
+        raise _size_error()
+
+
+def normalize_image(file):
+    """Проверяет загруженную картинку и возвращает очищенную копию.
+
+    Бросает ValidationError для слишком больших файлов и разрешений
+    и для анимаций.
+    """
+    check_size(file)
+    image = _open(file)
+    if getattr(image, 'is_animated', False):
+        raise ValidationError(
+            'Анимированные картинки не поддерживаются.', code='animated'
+        )
+    fmt = image.format if image.format in KEPT_FORMATS else 'JPEG'
+    max_side = _setting('IMAGE_MAX_SIDE', DEFAULT_MAX_SIDE)
+    # JPEG сразу декодируется в уменьшенном масштабе, не целиком.
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    # Кодировщики GIF, PNG и JPEG берут комментарии и EXIF из info,
+    # поэтому от исходных метаданных остаётся только нужное.
+    info, image.info = image.info, {
+        key: image.info[key] for key in KEPT_INFO if key in image.info
+    }
+    options = {}
+    if fmt == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options = {'quality': JPEG_QUALITY, 'optimize': True}
+    if info.get('icc_profile'):
+        # Цветовой профиль нужен для правильных цветов, остальное - нет.
+        options['icc_profile'] = info['icc_profile']
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    name = os.path.splitext(os.path.basename(file.name))[0]
+    return SimpleUploadedFile(
+        f'{name}.{KEPT_FORMATS[fmt]}',
+        buffer.getvalue(),
+        content_type=Image.MIME[fmt],
+    )
@@ -1,34 +1,67 @@
+from urllib.parse import urlencode
+
+from core.paginators import CursorPaginator
+from core.queries import query_budget
+
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from .feed_cache import cache_feed, depend_on, feed_fragment_key
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .object_cache import (get_cached_object_or_404,
+                           get_cached_post_or_404)
+from .search import highlight, search_posts
+from .timelines import TimelinePaginator, celebrity_ids
 
 
 POST_COUNT = 10
-CACHE_TIME = 20
+COMMENT_COUNT = 20
+# Ленты сбрасываются сигналами при изменениях, TTL лишь страхует.
+CACHE_TIME = 60 * 60
+# Бюджеты запросов view. При холодном кеше миниатюр каждая картинка
+# на странице стоит одного запроса к key-value store sorl-thumbnail:
+# все её варианты читаются разом (PregeneratedThumbnailBackend.lookup_many).
+IMAGE_QUERIES = POST_COUNT
+READ_TIME_MS = 100
+WRITE_TIME_MS = 200
 
 
 def paginate_page(request, posts):
-    paginator = Paginator(posts, POST_COUNT)
+    # Старые ссылки вида ?page=N обслуживаем постраничным Paginator,
+    # по умолчанию лента листается курсором без COUNT(*) и OFFSET.
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        return Paginator(posts, POST_COUNT).get_page(page_number)
+    paginator = CursorPaginator(posts, POST_COUNT)
+    return paginator.get_page(request.GET.get('cursor'))
+
 
+def paginate_comments(post_id, cursor):
+    comments = Comment.objects.filter(
+        post_id=post_id
+    ).select_related('author')
+    return CursorPaginator(comments, COMMENT_COUNT).get_page(cursor)
 
-@cache_page(CACHE_TIME, key_prefix='index_page')
+
+@query_budget(queries=4 + IMAGE_QUERIES, time_ms=READ_TIME_MS)
+@cache_feed('index_page', CACHE_TIME, 'index')
 def index(request):
     posts = Post.objects.select_related('author', 'group')
     page_obj = paginate_page(request=request, posts=posts)
     context = {
         'page_obj': page_obj,
+        'feed_key': feed_fragment_key(request, 'index'),
+        'cache_time': CACHE_TIME,
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(queries=5 + IMAGE_QUERIES, time_ms=READ_TIME_MS)
+@cache_feed('group_page', CACHE_TIME, 'group:{slug}')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = get_cached_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author', 'group')
     page_obj = paginate_page(request=request, posts=posts)
     context = {
@@ -39,8 +72,10 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(queries=7 + IMAGE_QUERIES, time_ms=READ_TIME_MS)
+@cache_feed('profile_page', CACHE_TIME, 'profile:{username}', 'groups')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_object_or_404(User, username=username)
     posts = author.posts.select_related('author', 'group')
     page_obj = paginate_page(request=request, posts=posts)
     following = (
@@ -53,14 +88,18 @@ def profile(request, username):
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        'posts_count': author.stats.posts_count,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(queries=8, time_ms=READ_TIME_MS)
+@cache_feed('post_page', CACHE_TIME, 'post:{post_id}', 'groups')
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_cached_post_or_404(post_id, request.user)
+    depend_on(request, f'profile:{post.author.username}')
     form = CommentForm()
-    comments = post.comments.all()
+    comments = paginate_comments(post.pk, request.GET.get('comments'))
     context = {
         'post': post,
         'form': form,
@@ -69,9 +108,40 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(queries=2, time_ms=READ_TIME_MS)
+@cache_feed('comments_page', CACHE_TIME, 'post:{post_id}')
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    context = {
+        'post_id': post_id,
+        'comments': paginate_comments(post_id, request.GET.get('cursor')),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+@query_budget(queries=4 + IMAGE_QUERIES, time_ms=READ_TIME_MS)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(query).select_related('author', 'group')
+    # Результаты упорядочены по релевантности, поэтому листаются номерами.
+    page_obj = Paginator(posts, POST_COUNT).get_page(request.GET.get('page'))
+    for post in page_obj:
+        post.highlight = highlight(post.snippet)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+# Создание поста: счётчики, файл картинки, fan-out и сброс лент.
+@query_budget(queries=14, time_ms=WRITE_TIME_MS)
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(
+        request.POST or None, files=request.FILES or None, request=request
+    )
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
@@ -83,24 +153,28 @@ def post_create(request):
     return render(request, 'posts/post_create.html', context)
 
 
+# Замена картинки добавляет запросы счётчиков ссылок на старый и новый
+# файл (counters.change_file_references).
+@query_budget(queries=15, time_ms=WRITE_TIME_MS)
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    # Правка читает пост из БД: в кеше объектов счётчики могут отставать.
+    # Автор нужен сигналам сброса кеша профиля - сразу, без второго
+    # запроса пользователя, которого уже загрузила аутентификация.
+    post = get_object_or_404(Post.objects.select_related('author'), pk=post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        request=request,
     )
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     if form.is_valid():
-        form.save()
+        # Пишутся только поля формы, чтобы не затереть comments_count,
+        # который меняется атомарными UPDATE.
+        form.save(commit=False).save(update_fields=form._meta.fields)
         return redirect('posts:post_detail', post_id)
-    form = PostForm(
-        request.POST or None,
-        files=request.FILES or None,
-        instance=post
-    )
     context = {
         'form': form,
         'post': post,
@@ -109,6 +183,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(queries=6, time_ms=WRITE_TIME_MS)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -121,26 +196,38 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(queries=5 + IMAGE_QUERIES, time_ms=READ_TIME_MS)
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate_page(request=request, posts=posts)
+    celebrities = list(celebrity_ids(request.user))
+    # Лента подписок листается только курсором: номера страниц
+    # потребовали бы COUNT(*) по всем её источникам.
+    paginator = TimelinePaginator(request.user, celebrities, POST_COUNT)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     context = {
         'page_obj': page_obj,
+        'feed_key': feed_fragment_key(
+            request,
+            f'follow:{request.user.pk}',
+            *(f'author:{author_id}' for author_id in celebrities),
+        ),
+        'cache_time': CACHE_TIME,
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(queries=12, time_ms=WRITE_TIME_MS)
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_object_or_404(User, username=username)
     if request.user != author:
         Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', author.username)
 
 
+@query_budget(queries=8, time_ms=WRITE_TIME_MS)
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', author.username)
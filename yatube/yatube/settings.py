@@ -44,12 +44,18 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'posts',
+    'posts.apps.PostsConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SamplingProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,10 +66,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Бюджеты запросов view (core.queries): в тестах превышение - ошибка,
+# иначе - предупреждение в логе.
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'core.test_runner.BudgetTestRunner'
+
+# Заголовок Server-Timing с временем SQL, шаблонов, миниатюр и кеша
+# (core.timing); строка лога core.timing пишется и без него.
+SERVER_TIMING = True
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,12 +100,20 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite в режиме WAL с PRAGMA из core.db.sqlite3.base.PRAGMAS;
+# соединения живут между запросами, транзакции - BEGIN IMMEDIATE.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
     }
 }
+# Базы только для чтения, см. core.db.routers; пусто - всё из default.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# Сколько секунд после записи чтение идёт из основной базы.
+REPLICA_MAX_LAG = 5
 
 
 # Password validation
@@ -145,9 +168,87 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Кто передаёт байты медиафайлов: None - сам Django через FileResponse,
+# 'x-accel-redirect' - nginx, 'x-sendfile' - Apache или lighttpd.
+MEDIA_SENDFILE = None
+# internal-location nginx, который смотрит в MEDIA_ROOT.
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Имена медиафайлов зависят от содержимого, поэтому кешируются надолго.
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+# Файлы со старыми, не хешированными именами кешируются ненадолго.
+MEDIA_MUTABLE_MAX_AGE = 60 * 5
+
+# Кеш общий для всех воркеров на машине: файлы SQLite в режиме WAL.
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # Кеш объектов по ключу: при переполнении вытесняются давно
+    # не запрошенные записи.
+    'objects': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'objects.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
 }
+
+# Метрики Prometheus на /metrics/ (core.metrics): снимки процессов
+# складываются в METRICS_DIR не реже раза в METRICS_FLUSH_INTERVAL
+# секунд. Эндпоинт отвечает только с этих адресов.
+METRICS_DIR = os.path.join(CACHE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Стеки статистического профилировщика (core.profiler) всех процессов
+# складываются в PROFILER_DIR не реже раза в PROFILER_FLUSH_INTERVAL
+# секунд; включается на странице админки /admin/profiler/.
+PROFILER_DIR = os.path.join(CACHE_DIR, 'profiles')
+PROFILER_FLUSH_INTERVAL = 5
+
+# SQL-запросы дольше стольких миллисекунд пишутся с планом в журнал
+# core.slow_queries; None - не писать.
+SLOW_QUERY_MS = 100
+LOG_DIR = os.path.join(BASE_DIR, 'logs')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'core.log.RotatingFileHandler',
+            'filename': os.path.join(LOG_DIR, 'slow_queries.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Миниатюры создаются в фоновом пуле потоков, а не во время запроса.
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+
+# Загрузки пишутся на диск по частям, картинки нормализуются в PostForm.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_SIDE = 2048